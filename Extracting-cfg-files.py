@@ -45,75 +45,449 @@ Extract only the 5th configuration:
 
 Extract a combination (5th, last 20, and every 5th):
     python extract_cfgs.py --input all_configs.cfg --output combined.cfg --config 5 --last 20 --every 5
+
+STREAMING AND THE INDEX:
+------------------------
+The file is never loaded into memory. A first pass over a memory map records the
+byte range of every BEGIN_CFG ... END_CFG block and saves it next to the input as
+<input>.idx.npz (reused while the input's size and modification time are unchanged;
+--rebuild-index forces a new scan). The selected byte ranges are then copied
+straight to the output, so with an index in place the run time depends on the
+number of selected configurations, not on the size of the .cfg file.
+
+CONTENT FILTERS AND DEDUPLICATION:
+----------------------------------
+The position-selected configurations (all of them if no --config/--last/--every is
+given) can be filtered by content. Only the Size, Supercell, AtomData, Energy and
+PlusStress sections of each block are parsed, straight into NumPy arrays:
+    --energy-per-atom MIN MAX   energy per atom (eV/atom) window
+    --max-force F               drop configurations with any |force| > F (eV/Å)
+    --max-stress S              drop configurations with any |PlusStress| component > S
+    --size MIN MAX              atom-count window
+    --species T [T ...]         keep configurations whose atom types are all in this list
+    --dedup-tol D               drop geometric near-duplicates: same cell, types and all
+                                positions on the same D-Å grid (hash of the rounded arrays)
+    --fps N                     farthest-point subsample of N configurations on a
+                                descriptor (per-atom energy + radial distribution histogram)
+Example (active-learning set of 500 diverse, low-force configurations):
+    python extract_cfgs.py --input all.cfg --output train.cfg --max-force 10 --dedup-tol 0.05 --fps 500
+
+SHARD / MERGE / SHUFFLE SUBCOMMANDS:
+------------------------------------
+The same byte-offset index drives three subcommands for building training sets.
+Inputs are indexed concurrently (one process per file) and blocks are copied
+through large buffered writes, reading from at most MAX_OPEN_INPUTS open inputs
+at a time; shards are written in parallel. Every output is written under a
+temporary name and renamed when complete, so a failed run leaves no partial file.
+    split    one .cfg into shards of N configurations or of about a byte size:
+             python extract_cfgs.py split --input all.cfg --configs-per-file 5000 --prefix shard
+             python extract_cfgs.py split --input all.cfg --max-bytes 2G --prefix shard
+    merge    many .cfg files into one, in input order:
+             python extract_cfgs.py merge --inputs run_*/train.cfg --output all.cfg
+    shuffle  many .cfg files into shuffled train/validation sets:
+             python extract_cfgs.py shuffle --inputs run_*/train.cfg --train train.cfg \\
+                 --valid valid.cfg --valid-fraction 0.1 --seed 0
 ===============================================================================
 """
 
 import argparse
+import glob
+import hashlib
+import itertools
+import mmap
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 
-def extract_cfgs(input_file, output_file, 
-                 config_number=None, 
-                 last_n=None, 
-                 every_k=None):
+BEGIN, END = b"BEGIN_CFG", b"END_CFG"
+COPY_CHUNK = 64 * 2 ** 20   # largest single write when copying merged byte ranges
+WRITE_BUFFER = 16 * 2 ** 20  # output buffer of the shard/merge/shuffle writers
+MAX_OPEN_INPUTS = 64        # input files kept open by one shard/merge/shuffle writer
+RDF_CUTOFF = 6.0            # Å, radial histogram range of the --fps descriptor
+RDF_BINS = 30
+
+
+def index_path(input_file):
+    return input_file + ".idx.npz"
+
+def _marker_lines(mm, marker):
+    """[start, end) byte ranges of the lines that hold only `marker` (surrounding blanks allowed, like line.strip())."""
+    found = []
+    pos = mm.find(marker)
+    while pos != -1:
+        line_start = mm.rfind(b"\n", 0, pos) + 1
+        line_end = mm.find(b"\n", pos)
+        line_end = len(mm) if line_end == -1 else line_end + 1
+        if not mm[line_start:pos].strip() and not mm[pos + len(marker):line_end].strip():
+            found.append((line_start, line_end))
+        pos = mm.find(marker, pos + len(marker))
+    return found
+
+def scan_cfg_offsets(input_file):
     """
-    Extract configurations from a .cfg file based on given options.
+    (M, 2) int64 array of [start, end) byte ranges of the BEGIN_CFG ... END_CFG blocks
+    (end includes the END_CFG line's newline). Markers are located with mmap.find, so the
+    scan runs at memory speed and never holds more than the offsets.
     """
-    with open(input_file, "r") as f:
-        lines = f.readlines()
-
-    # Split file into separate configuration blocks
-    configs = []
-    current_cfg = []
-    for line in lines:
-        if line.strip() == "BEGIN_CFG":
-            # Start a new config block
-            current_cfg = [line]
-        elif line.strip() == "END_CFG":
-            # End of config block → save it
-            current_cfg.append(line)
-            configs.append(current_cfg)
-            current_cfg = []
-        else:
-            # Accumulate lines for current config
-            if current_cfg is not None:
-                current_cfg.append(line)
+    if os.path.getsize(input_file) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        begins = np.array([start for start, _ in _marker_lines(mm, BEGIN)], dtype=np.int64)
+        ends = np.array([end for _, end in _marker_lines(mm, END)], dtype=np.int64)
+    # pair every END_CFG with the last BEGIN_CFG before it (a BEGIN_CFG without END_CFG is dropped)
+    last_begin = np.searchsorted(begins, ends, side="left") - 1
+    valid = last_begin >= 0
+    ends, last_begin = ends[valid], last_begin[valid]
+    # an END_CFG that follows another END_CFG with no new BEGIN_CFG in between closes nothing
+    first = np.ones(len(ends), dtype=bool)
+    first[1:] = last_begin[1:] != last_begin[:-1]
+    return np.stack([begins[last_begin[first]], ends[first]], axis=1)
 
-    selected_cfgs = []
+def load_or_build_index(input_file, rebuild=False, save=True):
+    """Byte ranges of all configurations, from the sidecar index if it matches the input file."""
+    stat = os.stat(input_file)
+    path = index_path(input_file)
+    if not rebuild and os.path.exists(path):
+        with np.load(path) as data:
+            if int(data["size"]) == stat.st_size and int(data["mtime_ns"]) == stat.st_mtime_ns:
+                return data["offsets"]
+    offsets = scan_cfg_offsets(input_file)
+    if save:
+        # write under a temporary name so concurrent runs never read a partial file
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp, offsets=offsets, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            os.replace(tmp, path)
+        except OSError as err:
+            print(f"Could not save the index ({err}); continuing without it.")
+    return offsets
+
+def select_indices(n_configs, config_number=None, last_n=None, every_k=None):
+    """0-based configuration indices chosen by --config/--last/--every, in selection order, without repeats."""
+    selected = []
 
     # Option 1: Extract a specific config by index
-    if config_number is not None and 1 <= config_number <= len(configs):
-        selected_cfgs.append(configs[config_number - 1])
+    if config_number is not None and 1 <= config_number <= n_configs:
+        selected.append(config_number - 1)
 
     # Option 2: Extract last n configs (if fewer exist, take all)
     if last_n is not None and last_n > 0:
-        if last_n >= len(configs):
-            selected_cfgs.extend(configs)  # take all
-        else:
-            selected_cfgs.extend(configs[-last_n:])
+        selected.extend(range(max(0, n_configs - last_n), n_configs))
 
     # Option 3: Extract every k-th config (always include last one)
-    if every_k is not None and every_k > 0:
-        selected_cfgs.extend(configs[i] for i in range(0, len(configs), every_k))
-        if configs[-1] not in selected_cfgs:
-            selected_cfgs.append(configs[-1])  # ensure last config included
+    if every_k is not None and every_k > 0 and n_configs:
+        selected.extend(range(0, n_configs, every_k))
+        selected.append(n_configs - 1)  # ensure last config included
 
     # Remove duplicates while preserving order
-    seen = set()
-    unique_cfgs = []
-    for cfg in selected_cfgs:
-        cfg_id = id(cfg)  # Use object ID to detect uniqueness
-        if cfg_id not in seen:
-            unique_cfgs.append(cfg)
-            seen.add(cfg_id)
+    return list(dict.fromkeys(selected))
+
+def copy_ranges(input_file, output_file, ranges):
+    """Copy byte ranges of input_file to output_file in order; touching ranges are merged into one copy."""
+    with open(input_file, "rb") as src, open(output_file, "wb") as dst:
+        if os.path.getsize(input_file) == 0:
+            return
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            merged = []
+            for start, end in ranges:
+                if merged and merged[-1][1] == start:
+                    merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+            for start, end in merged:
+                for pos in range(start, end, COPY_CHUNK):
+                    dst.write(mm[pos:min(end, pos + COPY_CHUNK)])
+
+def parse_cfg_block(block):
+    """
+    Parse the Size, Supercell, AtomData, Energy and PlusStress sections of one
+    BEGIN_CFG ... END_CFG block (bytes) into a dict of NumPy arrays: size, cell (3x3 or
+    None), types (N,), pos (N, 3), forces (N, 3 or None), energy (float or nan) and
+    stress (6,, or None).
+    """
+    lines = block.splitlines()
+    cfg = {"size": 0, "cell": None, "types": np.empty(0, dtype=np.int64), "pos": np.empty((0, 3)),
+           "forces": None, "energy": np.nan, "stress": None}
+    k = 0
+    while k < len(lines):
+        head = lines[k].strip()
+        if head == b"Size":
+            cfg["size"] = int(lines[k + 1])
+            k += 2
+        elif head == b"Supercell":
+            # one to three lattice vectors (fewer for non-periodic directions)
+            rows = []
+            while len(rows) < 3 and k + 1 < len(lines) and len(lines[k + 1].split()) == 3:
+                try:
+                    rows.append([float(x) for x in lines[k + 1].split()])
+                except ValueError:
+                    break
+                k += 1
+            cfg["cell"] = np.array(rows, dtype=np.float64)
+            k += 1
+        elif head.startswith(b"AtomData:"):
+            columns = head.split()[1:]
+            n = cfg["size"]
+            data = np.array(b" ".join(lines[k + 1:k + 1 + n]).split(), dtype=np.float64).reshape(n, len(columns))
+            col = {name: j for j, name in enumerate(columns)}
+            cfg["types"] = data[:, col[b"type"]].astype(np.int64)
+            cfg["pos"] = data[:, [col[b"cartes_x"], col[b"cartes_y"], col[b"cartes_z"]]]
+            if b"fx" in col:
+                cfg["forces"] = data[:, [col[b"fx"], col[b"fy"], col[b"fz"]]]
+            k += 1 + n
+        elif head == b"Energy":
+            cfg["energy"] = float(lines[k + 1])
+            k += 2
+        elif head.startswith(b"PlusStress:"):
+            cfg["stress"] = np.array(lines[k + 1].split()[:6], dtype=np.float64)
+            k += 2
+        else:
+            k += 1
+    return cfg
+
+def geometry_hash(cfg, tol):
+    """Hash of cell, types and positions rounded to a tol-Å grid (equal for near-duplicate geometries)."""
+    h = hashlib.sha1()
+    for arr in (cfg["cell"] if cfg["cell"] is not None else np.zeros(0), cfg["pos"]):
+        h.update(np.round(np.asarray(arr) / tol).astype(np.int64).tobytes())
+    h.update(cfg["types"].tobytes())
+    return h.hexdigest()
+
+def rdf_descriptor(cfg, cutoff=RDF_CUTOFF, bins=RDF_BINS):
+    """Radial distribution histogram (pairs per atom, periodic if a Supercell is given)."""
+    from scipy.spatial import cKDTree
+    pos = cfg["pos"]
+    if len(pos) == 0:
+        return np.zeros(bins)
+    if cfg["cell"] is not None and len(cfg["cell"]) == 3:
+        cell = cfg["cell"]
+        heights = abs(np.linalg.det(cell)) / np.linalg.norm(np.cross(cell[[1, 2, 0]], cell[[2, 0, 1]]), axis=1)
+        n_rep = np.ceil(cutoff / heights).astype(int)
+        shifts = np.array(list(itertools.product(*(range(-n, n + 1) for n in n_rep))), dtype=np.float64) @ cell
+        images = (pos[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    else:
+        images = pos
+    found = cKDTree(pos).sparse_distance_matrix(cKDTree(images), cutoff, output_type="ndarray")
+    d = found["v"][found["v"] > 1e-8]
+    return np.histogram(d, bins=bins, range=(0.0, cutoff))[0] / len(pos)
+
+def farthest_point_sample(descriptors, n_select):
+    """Indices of n_select rows chosen greedily, each the farthest from those already chosen (first row first)."""
+    n_select = min(n_select, len(descriptors))
+    if n_select == 0:
+        return []
+    chosen = [0]
+    dist = np.linalg.norm(descriptors - descriptors[0], axis=1)
+    for _ in range(n_select - 1):
+        nxt = int(np.argmax(dist))
+        chosen.append(nxt)
+        dist = np.minimum(dist, np.linalg.norm(descriptors - descriptors[nxt], axis=1))
+    return chosen
+
+def filter_by_content(input_file, offsets, indices, energy_per_atom=None, max_force=None, max_stress=None,
+                      size=None, species=None, dedup_tol=None, fps=None):
+    """Configuration indices (subset of `indices`, same order) that pass the content filters, deduplication and FPS."""
+    kept, energies, descriptors, seen = [], [], [], set()
+    allowed = None if species is None else np.array(sorted(species), dtype=np.int64)
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in indices:
+            start, end = offsets[i]
+            cfg = parse_cfg_block(mm[start:end])
+            n = cfg["size"]
+            if size is not None and not size[0] <= n <= size[1]:
+                continue
+            if energy_per_atom is not None and not (n and energy_per_atom[0] <= cfg["energy"] / n <= energy_per_atom[1]):
+                continue
+            if max_force is not None and cfg["forces"] is not None and n and \
+                    np.sqrt((cfg["forces"] ** 2).sum(axis=1)).max() > max_force:
+                continue
+            if max_stress is not None and cfg["stress"] is not None and np.abs(cfg["stress"]).max() > max_stress:
+                continue
+            if allowed is not None and not np.isin(cfg["types"], allowed).all():
+                continue
+            if dedup_tol:
+                key = geometry_hash(cfg, dedup_tol)
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(i)
+            if fps:
+                energies.append(cfg["energy"] / n if n else 0.0)
+                descriptors.append(rdf_descriptor(cfg))
+    if fps and len(kept) > fps:
+        desc = np.column_stack([np.array(energies), np.array(descriptors)])
+        desc = (desc - desc.mean(axis=0)) / np.where(desc.std(axis=0) > 0, desc.std(axis=0), 1.0)
+        kept = [kept[j] for j in sorted(farthest_point_sample(desc, fps))]
+    return kept
+
+def extract_cfgs(input_file, output_file, 
+                 config_number=None, 
+                 last_n=None, 
+                 every_k=None,
+                 rebuild_index=False,
+                 save_index=True,
+                 **content_filters):
+    """
+    Extract configurations from a .cfg file based on given options. content_filters are
+    the keyword arguments of filter_by_content (energy_per_atom, max_force, max_stress,
+    size, species, dedup_tol, fps); without a position option they apply to all configs.
+    """
+    offsets = load_or_build_index(input_file, rebuild_index, save_index)
+    content_filters = {key: value for key, value in content_filters.items() if value is not None}
+    if content_filters and config_number is None and last_n is None and every_k is None:
+        selected = list(range(len(offsets)))
+    else:
+        selected = select_indices(len(offsets), config_number, last_n, every_k)
+    if content_filters:
+        n_candidates = len(selected)
+        selected = filter_by_content(input_file, offsets, selected, **content_filters)
+        print(f"Content filters kept {len(selected)} of {n_candidates} configurations")
 
     # Write results into output file
-    with open(output_file, "w") as f:
-        for cfg in unique_cfgs:
-            f.writelines(cfg)
+    copy_ranges(input_file, output_file, offsets[selected].tolist())
+
+    print(f"Extracted {len(selected)} configurations into {output_file}")
+
+
+# ==========================
+# SHARD / MERGE / SHUFFLE
+# ==========================
+def expand_inputs(patterns):
+    """Input files from paths or (quoted) glob patterns, in the given order."""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern!r}")
+        files += matches
+    return files
+
+def index_files(files, n_workers=None, rebuild=False):
+    """Byte-range index of every input file, built concurrently (or loaded from the sidecars)."""
+    if len(files) == 1:
+        return [load_or_build_index(files[0], rebuild)]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(load_or_build_index, files, itertools.repeat(rebuild)))
+
+def write_blocks(output_file, files, blocks, max_open=MAX_OPEN_INPUTS):
+    """
+    Write blocks (file index, start, end) of the input files, in order. Inputs are read
+    through a small LRU of open files, so the number of descriptors stays bounded however
+    many inputs there are (merge visits each file once, shuffle revisits them at random).
+    The output is written under a temporary name and renamed on success.
+    """
+    tmp = f"{output_file}.{os.getpid()}.tmp"
+    handles = OrderedDict()
+    try:
+        with open(tmp, "wb", buffering=WRITE_BUFFER) as dst:
+            for k, start, end in blocks:
+                src = handles.get(k)
+                if src is None:
+                    if len(handles) >= max_open:
+                        handles.popitem(last=False)[1].close()
+                    src = handles[k] = open(files[k], "rb", buffering=0)
+                else:
+                    handles.move_to_end(k)
+                src.seek(start)
+                block = src.read(end - start)
+                # a file may end in END_CFG without a newline; keep the next block on its own line
+                dst.write(block if block.endswith(b"\n") else block + b"\n")
+        os.replace(tmp, output_file)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        for src in handles.values():
+            src.close()
+
+def parse_bytes(text):
+    """'500M' -> 524288000 (K, M, G suffixes)."""
+    units = {"K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30}
+    text = text.strip().upper().rstrip("B")
+    return int(float(text[:-1]) * units[text[-1]]) if text[-1:] in units else int(text)
+
+def split_cfg(input_file, prefix, configs_per_file=None, max_bytes=None, n_workers=None, rebuild_index=False):
+    """Split one .cfg into <prefix>_0000.cfg, ... of configs_per_file configurations or about max_bytes each."""
+    offsets = index_files([input_file], rebuild=rebuild_index)[0]
+    if configs_per_file:
+        bounds = list(range(0, len(offsets), configs_per_file)) + [len(offsets)]
+    else:
+        # start a new shard whenever the running size would pass max_bytes
+        sizes = np.cumsum(offsets[:, 1] - offsets[:, 0])
+        bounds, base = [0], 0
+        while bounds[-1] < len(offsets):
+            nxt = max(bounds[-1] + 1, int(np.searchsorted(sizes, base + max_bytes, side="right")))
+            bounds.append(min(nxt, len(offsets)))
+            base = sizes[bounds[-1] - 1]
+    shards = [(f"{prefix}_{k:04d}.cfg", [(0, s, e) for s, e in offsets[lo:hi].tolist()])
+              for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])) if hi > lo]
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        list(pool.map(lambda shard: write_blocks(shard[0], [input_file], shard[1]), shards))
+    print(f"Split {len(offsets)} configurations of {input_file} into {len(shards)} files {prefix}_*.cfg")
+
+def merge_cfgs(input_files, output_file, n_workers=None, rebuild_index=False):
+    """Concatenate the configurations of many .cfg files (only the BEGIN_CFG ... END_CFG blocks)."""
+    indexes = index_files(input_files, n_workers, rebuild_index)
+    blocks = [(k, s, e) for k, offsets in enumerate(indexes) for s, e in offsets.tolist()]
+    write_blocks(output_file, input_files, blocks)
+    print(f"Merged {len(blocks)} configurations from {len(input_files)} files into {output_file}")
+
+def shuffle_cfgs(input_files, train_file, valid_file=None, valid_fraction=0.1, seed=None, n_workers=None,
+                 rebuild_index=False):
+    """Shuffle the configurations of many .cfg files into a training and (optionally) a validation file."""
+    indexes = index_files(input_files, n_workers, rebuild_index)
+    blocks = [(k, s, e) for k, offsets in enumerate(indexes) for s, e in offsets.tolist()]
+    order = np.random.default_rng(seed).permutation(len(blocks))
+    n_valid = int(round(valid_fraction * len(blocks))) if valid_file else 0
+    jobs = [(train_file, [blocks[i] for i in order[n_valid:]])]
+    if valid_file:
+        jobs.append((valid_file, [blocks[i] for i in order[:n_valid]]))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda job: write_blocks(job[0], input_files, job[1]), jobs))
+    print(f"Shuffled {len(blocks)} configurations from {len(input_files)} files: "
+          f"{len(blocks) - n_valid} -> {train_file}" + (f", {n_valid} -> {valid_file}" if valid_file else ""))
+
+def subcommand_main(argv):
+    """split / merge / shuffle command line."""
+    parser = argparse.ArgumentParser(description="Split, merge and shuffle MTP .cfg files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("split", help="Split one .cfg into shards")
+    p.add_argument("--input", required=True)
+    p.add_argument("--prefix", required=True, help="Shards are written as <prefix>_0000.cfg, ...")
+    size = p.add_mutually_exclusive_group(required=True)
+    size.add_argument("--configs-per-file", type=int)
+    size.add_argument("--max-bytes", type=parse_bytes, help="About this many bytes per shard (e.g. 500M, 2G)")
+    for name in ("merge", "shuffle"):
+        p = sub.add_parser(name, help=f"{name.capitalize()} many .cfg files")
+        p.add_argument("--inputs", nargs="+", required=True, help="Input .cfg files or quoted glob patterns")
+        if name == "merge":
+            p.add_argument("--output", required=True)
+        else:
+            p.add_argument("--train", required=True)
+            p.add_argument("--valid", help="Validation output (omit for a shuffled training file only)")
+            p.add_argument("--valid-fraction", type=float, default=0.1)
+            p.add_argument("--seed", type=int)
+    for p in sub.choices.values():
+        p.add_argument("--workers", type=int, help="Parallel workers (default: all cores)")
+        p.add_argument("--rebuild-index", action="store_true", help="Rescan inputs even if their index exists")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        split_cfg(args.input, args.prefix, args.configs_per_file, args.max_bytes, args.workers, args.rebuild_index)
+    elif args.command == "merge":
+        merge_cfgs(expand_inputs(args.inputs), args.output, args.workers, args.rebuild_index)
+    else:
+        shuffle_cfgs(expand_inputs(args.inputs), args.train, args.valid, args.valid_fraction, args.seed,
+                     args.workers, args.rebuild_index)
 
-    print(f"Extracted {len(unique_cfgs)} configurations into {output_file}")
 
+if __name__ == "__main__" and sys.argv[1:2] and sys.argv[1] in ("split", "merge", "shuffle"):
+    subcommand_main(sys.argv[1:])
 
-if __name__ == "__main__":
+elif __name__ == "__main__":
     # Command-line argument parsing
     parser = argparse.ArgumentParser(
         description="Extract specific configurations from a .cfg file"
@@ -123,6 +497,15 @@ if __name__ == "__main__":
     parser.add_argument("--config", type=int, help="Extract specific config number (1-based index)")
     parser.add_argument("--last", type=int, help="Extract last N configs (or all if fewer exist)")
     parser.add_argument("--every", type=int, help="Extract every K-th config (always includes last one)")
+    parser.add_argument("--energy-per-atom", type=float, nargs=2, metavar=("MIN", "MAX"), help="Energy per atom window (eV/atom)")
+    parser.add_argument("--max-force", type=float, help="Drop configs with any force norm above this (eV/A)")
+    parser.add_argument("--max-stress", type=float, help="Drop configs with any |PlusStress| component above this")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("MIN", "MAX"), help="Atom-count window")
+    parser.add_argument("--species", type=int, nargs="+", help="Keep configs whose atom types are all in this list")
+    parser.add_argument("--dedup-tol", type=float, help="Drop near-duplicate geometries on this grid (A)")
+    parser.add_argument("--fps", type=int, help="Farthest-point subsample of this many configs")
+    parser.add_argument("--rebuild-index", action="store_true", help="Rescan the input even if <input>.idx.npz exists")
+    parser.add_argument("--no-save-index", action="store_true", help="Do not write the <input>.idx.npz sidecar")
 
     args = parser.parse_args()
 
@@ -132,5 +515,14 @@ if __name__ == "__main__":
         output_file=args.output,
         config_number=args.config,
         last_n=args.last,
-        every_k=args.every
+        every_k=args.every,
+        rebuild_index=args.rebuild_index,
+        save_index=not args.no_save_index,
+        energy_per_atom=args.energy_per_atom,
+        max_force=args.max_force,
+        max_stress=args.max_stress,
+        size=args.size,
+        species=args.species,
+        dedup_tol=args.dedup_tol,
+        fps=args.fps
     )
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+benchmark_bond_backends.py
+
+Compare the "python" and "numba" optimizer backends of
+creating_str_from_number_of_bonds.py in SA steps per second, on equimolar
+3-type BCC templates of 128, 1k, 16k and 128k sites.
+
+Usage (from the folder containing creating_str_from_number_of_bonds.py):
+    python benchmark_bond_backends.py
+
+Requirements: ASE, numpy, numba
+"""
+
+import contextlib
+import io
+import time
+import numpy as np
+from ase.build import bulk
+
+import creating_str_from_number_of_bonds as bonds
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+CUTOFF = 2.8
+# cubic BCC repeats -> 128, 1024, 16384, 131072 sites
+TEMPLATE_REPEATS = [(4, 4, 4), (8, 8, 8), (16, 16, 32), (32, 32, 64)]
+PYTHON_STEPS = 20000
+NUMBA_STEPS = 2000000
+RNG_SEED = 0
+
+
+def make_problem(repeat, rng):
+    """Return (types, pairs, neigh, targets) for an equimolar 3-type BCC cell."""
+    atoms = bulk("Cr", crystalstructure="bcc", a=3.0, cubic=True).repeat(repeat)
+    n_sites = len(atoms)
+    pairs = bonds.build_neighbor_pairs(atoms, CUTOFF)
+    neigh = bonds.build_csr_adjacency(pairs, n_sites)
+    composition = {1: n_sites - 2 * (n_sites // 3), 2: n_sites // 3, 3: n_sites // 3}
+    types = bonds.random_types_from_composition(n_sites, composition, rng)
+    keys = [(1, 1), (1, 2), (1, 3), (2, 2), (2, 3), (3, 3)]
+    targets = {k: len(pairs) // len(keys) for k in keys}
+    return types, pairs, neigh, targets
+
+
+def steps_per_second(backend, n_steps, types, pairs, neigh, targets, rng):
+    """Time one SA run (output suppressed) and return steps per second."""
+    t0 = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bonds.simulated_annealing_swaps(types.copy(), pairs, targets, neigh,
+                                        n_steps=n_steps, print_every=n_steps,
+                                        rng=rng, backend=backend)
+    return n_steps / (time.time() - t0)
+
+
+def main():
+    rng = np.random.default_rng(RNG_SEED)
+    have_numba = bonds.njit is not None
+    if not have_numba:
+        print("numba is not installed; only the python backend is timed.")
+
+    print(f"{'sites':>8} {'pairs':>9} {'python steps/s':>15} {'numba steps/s':>15} {'speedup':>8}")
+    for repeat in TEMPLATE_REPEATS:
+        types, pairs, neigh, targets = make_problem(repeat, rng)
+        py_rate = steps_per_second("python", PYTHON_STEPS, types, pairs, neigh, targets, rng)
+        if have_numba:
+            # warm-up run so JIT compilation is not timed
+            steps_per_second("numba", 1000, types, pairs, neigh, targets, rng)
+            nb_rate = steps_per_second("numba", NUMBA_STEPS, types, pairs, neigh, targets, rng)
+            print(f"{len(types):8d} {len(pairs):9d} {py_rate:15.0f} {nb_rate:15.0f} {nb_rate / py_rate:7.1f}x")
+        else:
+            print(f"{len(types):8d} {len(pairs):9d} {py_rate:15.0f} {'-':>15} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+benchmark_bond_init.py
+
+Compare INIT_METHOD = "random" and "greedy" of creating_str_from_number_of_bonds.py
+by the number of SA steps needed to reach a bond-count residual. SA runs in adaptive
+mode with SA_STOP_COST = RESIDUAL_GOAL; for integer residuals sum(r^2) >= sum(|r|),
+so the reported step is the first one with an L1 residual <= RESIDUAL_GOAL.
+
+Targets are made feasible by taking the pair counts of a random configuration and
+shifting SRO_SHIFT bonds from unlike to like pairs (keeps every per-type bond sum).
+
+Usage (from the folder containing creating_str_from_number_of_bonds.py):
+    python benchmark_bond_init.py
+
+Requirements: ASE, numpy, scipy (numba recommended)
+"""
+
+import contextlib
+import io
+import time
+import numpy as np
+from ase.build import bulk
+
+import creating_str_from_number_of_bonds as bonds
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+CUTOFF = 2.8
+TEMPLATE_REPEATS = [(8, 8, 8), (16, 16, 32)]   # cubic BCC -> 1024, 16384 sites
+SRO_SHIFT_PER_SITE = 0.5       # bonds moved from (1,2)/(1,3) to (1,1)/(2,3), per site
+RESIDUAL_GOAL = 20
+MAX_STEPS = 20000000
+N_SEEDS = 3
+BACKEND = "numba"              # falls back to python without numba
+
+
+def make_problem(repeat, rng):
+    """Return (n_sites, composition, pairs, neigh, targets) for an equimolar BCC cell."""
+    atoms = bulk("Cr", crystalstructure="bcc", a=3.0, cubic=True).repeat(repeat)
+    n_sites = len(atoms)
+    pairs = bonds.build_neighbor_pairs(atoms, CUTOFF)
+    neigh = bonds.build_csr_adjacency(pairs, n_sites)
+    composition = {1: n_sites - 2 * (n_sites // 3), 2: n_sites // 3, 3: n_sites // 3}
+    ref = bonds.random_types_from_composition(n_sites, composition, rng)
+    type_values, tix = bonds.build_type_index(ref, {})
+    targets = bonds.count_matrix_to_dict(bonds.init_count_matrix(tix, pairs, len(type_values)), type_values)
+    shift = int(SRO_SHIFT_PER_SITE * n_sites)
+    targets[(1, 1)] += shift
+    targets[(2, 3)] += shift
+    targets[(1, 2)] -= shift
+    targets[(1, 3)] -= shift
+    return n_sites, composition, pairs, neigh, targets
+
+
+def main():
+    adaptive = {"stop_cost": RESIDUAL_GOAL, "accept_start": 0.3, "accept_end": 0.001,
+                "window": 2000, "stall_steps": 200000}
+    print(f"{'sites':>8} {'init':>7} {'init L1':>9} {'init s':>7} {'SA steps to L1<=' + str(RESIDUAL_GOAL):>20}")
+    for repeat in TEMPLATE_REPEATS:
+        rng = np.random.default_rng(0)
+        n_sites, composition, pairs, neigh, targets = make_problem(repeat, rng)
+        for method in ("random", "greedy"):
+            init_l1, init_time, steps = [], [], []
+            for seed in range(N_SEEDS):
+                rng = np.random.default_rng(seed)
+                t0 = time.time()
+                types = bonds.initial_types(method, n_sites, composition, targets, pairs, neigh, rng)
+                init_time.append(time.time() - t0)
+                type_values, tix = bonds.build_type_index(types, targets)
+                counts = bonds.count_matrix_to_dict(bonds.init_count_matrix(tix, pairs, len(type_values)),
+                                                    type_values)
+                init_l1.append(bonds.total_l1_residual(counts, targets))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    _, _, stats, _ = bonds.simulated_annealing_swaps(
+                        types, pairs, targets, neigh, n_steps=MAX_STEPS, print_every=MAX_STEPS,
+                        rng=rng, backend=BACKEND, adaptive=adaptive)
+                steps.append(stats["steps_run"])
+            # first seed's init time includes JIT compilation; report the fastest
+            print(f"{n_sites:8d} {method:>7} {np.mean(init_l1):9.0f} {min(init_time):7.2f} {np.mean(steps):20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+benchmark_wc_backends.py
+
+Compare the "numpy" and "mdapy" Warren-Cowley backends of wc_para_3_elements.py
+on random equimolar 3-type BCC cells from 128 to 250k atoms. For each size it
+reports the first frame (mdapy: Taichi start-up, JIT and neighbor list; numpy:
+KD-tree neighbor list) and the mean time of the following frames, which reuse the
+neighbor list and only recount type pairs (MC swap trajectories).
+
+Usage (from the folder containing wc_para_3_elements.py):
+    python benchmark_wc_backends.py
+
+Requirements: numpy, scipy (mdapy optional)
+"""
+
+import time
+import numpy as np
+import scipy.spatial  # noqa: F401  (imported up front so the first size is not charged for it)
+
+import wc_para_3_elements as wc
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+CUTOFF = 2.8
+LATTICE_PARAMETER = 2.88
+# cubic BCC repeats -> 128, 1024, 16000, 128000, 250000 atoms
+REPEATS = [4, 8, 20, 40, 50]
+N_FRAMES = 20               # frames per size (the first one is timed separately)
+RNG_SEED = 0
+
+
+def make_frames(n, rng):
+    """N_FRAMES frames of one n x n x n BCC cell with shuffled equimolar types."""
+    g = np.array(np.meshgrid(*[np.arange(n)] * 3, indexing="ij"), dtype=np.float64).reshape(3, -1).T
+    pos = np.vstack([g, g + 0.5]) * LATTICE_PARAMETER
+    box = np.vstack([np.eye(3) * n * LATTICE_PARAMETER, np.zeros(3)])
+    types = np.arange(len(pos)) % 3 + 1
+    return [{"timestep": k, "box": box, "boundary": [1, 1, 1], "pos": pos, "type": rng.permutation(types)}
+            for k in range(N_FRAMES)]
+
+
+def time_backend(frames, backend):
+    """(first frame seconds, mean seconds of the other frames, WC matrix of the last frame)."""
+    wc._NEIGHBORS.pop(backend, None)
+    t0 = time.perf_counter()
+    wc.frame_wc(frames[0], [(0.0, CUTOFF)], 3, backend)
+    first = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for frame in frames[1:-1]:
+        wc.frame_wc(frame, [(0.0, CUTOFF)], 3, backend)
+    result = wc.frame_wc(frames[-1], [(0.0, CUTOFF)], 3, backend)
+    return first, (time.perf_counter() - t0) / (len(frames) - 1), result
+
+
+def main():
+    rng = np.random.default_rng(RNG_SEED)
+    have_mdapy = wc._have_mdapy()
+    if not have_mdapy:
+        print("mdapy is not installed; only the numpy backend is timed.")
+
+    print(f"{'atoms':>8} {'numpy first':>12} {'numpy/frame':>12} {'mdapy first':>12} {'mdapy/frame':>12} {'max |diff|':>11}")
+    for n in REPEATS:
+        frames = make_frames(n, rng)
+        np_first, np_frame, np_wc = time_backend(frames, "numpy")
+        if have_mdapy:
+            md_first, md_frame, md_wc = time_backend(frames, "mdapy")
+            print(f"{len(frames[0]['pos']):8d} {np_first:11.3f}s {np_frame * 1e3:10.2f}ms "
+                  f"{md_first:11.3f}s {md_frame * 1e3:10.2f}ms {np.abs(np_wc - md_wc).max():11.2e}")
+        else:
+            print(f"{len(frames[0]['pos']):8d} {np_first:11.3f}s {np_frame * 1e3:10.2f}ms "
+                  f"{'-':>12} {'-':>12} {'-':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,29 @@ build_structure_from_bonds_complete.py
 Usage: edit USER INPUTS below and run:
     python build_structure_from_bonds_complete.py
 
-Requirements: ASE, numpy
+Requirements: ASE, numpy, scipy (optional: numba for BACKEND = "numba")
 """
 
+import contextlib
+import csv
+import hashlib
+import io
 import math
+import os
 import time
-from collections import defaultdict, Counter
+from bisect import bisect_left
+from collections import defaultdict
+from multiprocessing import Pool, shared_memory
 import numpy as np
 from ase.io import read, write
 from ase.neighborlist import neighbor_list
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order
+
+try:
+    from numba import njit
+except ImportError:  # optional: compiled SA/greedy kernels
+    njit = None
 
 # ==========================
 # USER INPUTS (edit these)
@@ -21,6 +35,7 @@ from ase.neighborlist import neighbor_list
 TEMPLATE_FILE = "template.lmp"       # input template (LAMMPS data, POSCAR, ...)
 TEMPLATE_FORMAT = "lammps-data"      # change to "vasp" for POSCAR
 CUTOFF = 2.8                         # neighbor cutoff (Å)
+TOPOLOGY_CACHE_DIR = ".topology_cache"  # .npz cache of neighbor pairs/CSR per template; None disables
 # target bond counts (unordered, pair keys as (min_type, max_type))
 target_bonds = {
     (1, 1): 901,
@@ -30,9 +45,22 @@ target_bonds = {
     (2,3):2190,
     (3,3):13
 }
+# multi-shell short-range order (optional). SHELLS lists the (r_min, r_max] distance window
+# (Å) of each neighbor shell; shell_targets gives, per shell, either pair-count targets
+# {(t1, t2): n} or Warren-Cowley parameters {"alpha": {(t1, t2): a}} (converted to pair
+# counts for the fixed composition). SHELL_WEIGHTS scales each shell's cost (None = all 1).
+# With SHELLS = None the single CUTOFF shell and target_bonds are used.
+SHELLS = None            # e.g. [(0.0, 2.8), (2.8, 3.2), (3.2, 4.5)]
+shell_targets = None     # e.g. [target_bonds, {"alpha": {(1, 1): 0.1, (1, 2): -0.05}}, ...]
+SHELL_WEIGHTS = None
+
 # composition: integer type -> number atoms
 composition = {1: 341, 2: 341, 3: 341}         # sum must equal number of sites in template
 
+# starting configuration: "random" (uniform shuffle) or "greedy" (site-by-site assignment
+# whose pair counts track target_bonds; SA then starts close to the target)
+INIT_METHOD = "random"
+
 # mapping integer type -> element symbol (must be valid element symbols)
 type_to_symbol = {1: "Cr", 2: "Mn", 3: "V"}
 
@@ -42,13 +70,53 @@ SA_T0 = 2.0
 SA_T_FINAL = 0.01
 SA_PRINT_EVERY = 20000
 
+# adaptive SA (optional): stop once the cost reaches SA_STOP_COST, steer T every
+# SA_ADAPT_WINDOW steps toward a target acceptance rate that decays geometrically from
+# SA_ACCEPT_START to SA_ACCEPT_END, and reheat to SA_T0 after SA_STALL_STEPS steps
+# without a new best. The greedy fixer then also stops at GREEDY_STOP_L1.
+SA_ADAPTIVE = False
+SA_STOP_COST = 0
+SA_ACCEPT_START = 0.3
+SA_ACCEPT_END = 0.001
+SA_ADAPT_WINDOW = 2000
+SA_STALL_STEPS = 100000
+GREEDY_STOP_L1 = 0
+
 # greedy fixer params
 GREEDY_MAX_NO_IMPROVE = 100000
 
+# optimizer backend: "python" (reproduces the RNG_SEED trajectory) or "numba"
+# (whole SA/greedy loop as a compiled kernel; falls back to "python" without numba)
+BACKEND = "python"
+
+# parallel tempering (replica exchange) instead of a single SA run: set PT_N_REPLICAS > 1.
+# Each replica runs SA_N_STEPS Metropolis steps at a fixed temperature of a geometric
+# ladder PT_T_MIN..PT_T_MAX; neighboring replicas try to swap configurations every
+# PT_EXCHANGE_EVERY steps. All replicas start from the INIT_METHOD configuration.
+# Replica segments use the compiled kernels with BACKEND = "numba". The temperatures
+# are fixed, so PT cannot be combined with SA_ADAPTIVE.
+PT_N_REPLICAS = 0
+PT_T_MIN = 0.05
+PT_T_MAX = 5.0
+PT_EXCHANGE_EVERY = 20000
+PT_N_WORKERS = None      # processes in the pool; None = all cores
+
 # output
 OUTPUT_FILE = "optimized_structure.lmp"
 OUTPUT_FORMAT = "lammps-data"
 
+# batch mode: set BATCH_TABLE to a CSV file to generate many structures in one run.
+# Columns: composition, target_bonds, count and optionally template, e.g.
+#   composition,target_bonds,count
+#   "1:341 2:341 3:341","1-1:901 1-2:413 1-3:512 2-2:60 2-3:2190 3-3:13",100
+# The neighbor topology is built once per template; structures are optimized (SA + greedy)
+# in a process pool and written as BATCH_OUTPUT_DIR/structure_00001.lmp, ... together
+# with BATCH_OUTPUT_DIR/summary.csv of the final residuals. Batch mode optimizes the single
+# CUTOFF shell only, so SHELLS must be None; every type in the table needs a type_to_symbol entry.
+BATCH_TABLE = None
+BATCH_OUTPUT_DIR = "batch_structures"
+BATCH_N_WORKERS = None   # processes in the pool; None = all cores
+
 # Optional: create a simple template automatically if TEMPLATE_FILE missing.
 CREATE_TEMPLATE_IF_MISSING = True
 SIMPLE_TEMPLATE_SYMBOL = "Cr"
@@ -70,27 +138,73 @@ def create_simple_template(n_cells=(4,4,4), symbol="Cr", out="template.lmp"):
     print(f"Created simple template '{out}' with {len(atoms)} atoms (symbol={symbol}).")
     return out
 
-def build_neighbor_pairs(atoms, cutoff):
-    """Return unique sorted array of neighbor pairs (i,j) with i<j."""
+def build_neighbor_pairs(atoms, cutoff, r_min=0.0):
+    """Return unique sorted array of neighbor pairs (i,j) with i<j and r_min < d <= cutoff."""
     i_list, j_list, d_list = neighbor_list("ijd", atoms, cutoff)
-    pairs = []
-    for i, j in zip(i_list, j_list):
-        if i == j:
-            continue
-        if i < j:
-            pairs.append((i, j))
-        else:
-            pairs.append((j, i))
-    pairs = sorted(set(pairs))
-    return np.array(pairs, dtype=int)
+    keep = (i_list != j_list) & (d_list > r_min)
+    lo = np.minimum(i_list[keep], j_list[keep])
+    hi = np.maximum(i_list[keep], j_list[keep])
+    # sort by (i, j) and drop repeats (the same pair seen through several periodic images)
+    order = np.lexsort((hi, lo))
+    lo, hi = lo[order], hi[order]
+    first = np.ones(len(lo), dtype=bool)
+    first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+    return np.stack([lo[first], hi[first]], axis=1).astype(int)
 
-def build_adjacency_list(pairs, n_sites):
-    """Return neighbors list per site for quick local updates."""
-    neigh = [[] for _ in range(n_sites)]
-    for a, b in pairs:
-        neigh[a].append(b)
-        neigh[b].append(a)
-    return neigh
+def topology_cache_key(atoms, cutoff, r_min=0.0):
+    """Hash of positions, cell, pbc and cutoff (and shell r_min) identifying a neighbor topology."""
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(atoms.get_positions(), dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(atoms.get_cell().array, dtype=np.float64).tobytes())
+    h.update(np.asarray(atoms.get_pbc(), dtype=bool).tobytes())
+    h.update(repr(float(cutoff)).encode())
+    if r_min > 0:
+        h.update(repr(float(r_min)).encode())
+    return h.hexdigest()[:20]
+
+def load_or_build_topology(atoms, cutoff, cache_dir=None, r_min=0.0):
+    """
+    Return (pairs, (indptr, indices)) for atoms and the (r_min, cutoff] shell. With
+    cache_dir set, the arrays are loaded from / saved to cache_dir/neighbors_<key>.npz.
+    """
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"neighbors_{topology_cache_key(atoms, cutoff, r_min)}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                print(f"Loaded neighbor topology from cache '{path}'.")
+                return data["pairs"], (data["indptr"], data["indices"])
+    pairs = build_neighbor_pairs(atoms, cutoff, r_min)
+    indptr, indices = build_csr_adjacency(pairs, len(atoms))
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write under a temporary name so concurrent runs never read a partial file
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, pairs=pairs, indptr=indptr, indices=indices)
+        os.replace(tmp, path)
+        print(f"Saved neighbor topology to cache '{path}'.")
+    return pairs, (indptr, indices)
+
+def build_csr_adjacency(pairs, n_sites):
+    """Return CSR neighbor arrays (indptr, indices); each row is sorted."""
+    src = np.concatenate([pairs[:, 0], pairs[:, 1]]).astype(np.int64)
+    dst = np.concatenate([pairs[:, 1], pairs[:, 0]]).astype(np.int64)
+    order = np.lexsort((dst, src))
+    indices = dst[order]
+    indptr = np.zeros(n_sites + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_sites), out=indptr[1:])
+    return indptr, indices
+
+def stack_shell_topologies(topologies):
+    """
+    Combine per-shell (pairs, (indptr, indices)) into (pairs_list, (indptr, indices)) where
+    indptr is (n_shells, n_sites + 1) and points into one concatenated indices array.
+    """
+    pairs_list = [pairs for pairs, _ in topologies]
+    offsets = np.cumsum([0] + [len(nb[1]) for _, nb in topologies[:-1]])
+    indptr = np.stack([nb[0] + off for (_, nb), off in zip(topologies, offsets)])
+    indices = np.concatenate([nb[1] for _, nb in topologies])
+    return pairs_list, (indptr, indices)
 
 def random_types_from_composition(n_sites, composition, rng):
     """Return shuffled int array of types respecting composition."""
@@ -111,211 +225,1060 @@ def init_counts_from_pairs(types, pairs):
         counts[key] += 1
     return counts
 
+def wc_alpha_to_pair_targets(alpha, composition, n_pairs):
+    """
+    Convert Warren-Cowley parameters {(t1, t2): alpha} of one shell into unordered pair-count
+    targets for the fixed composition, with Z = 2 * n_pairs / n_sites neighbors per site:
+    N_ij = n_i * Z * c_j * (1 - alpha_ij) for i != j and N_ii = n_i * Z * c_i * (1 - alpha_ii) / 2.
+    """
+    n_sites = sum(composition.values())
+    z = 2.0 * n_pairs / n_sites
+    targets = {}
+    for (t1, t2), a in alpha.items():
+        t1, t2 = sorted((int(t1), int(t2)))
+        n = composition[t1] * z * composition[t2] / n_sites * (1.0 - a)
+        targets[(t1, t2)] = int(round(n / 2 if t1 == t2 else n))
+    return targets
+
+def pair_counts_to_wc_alpha(counts, composition, n_pairs):
+    """Inverse of wc_alpha_to_pair_targets: {(t1, t2): alpha} for the given pair counts."""
+    n_sites = sum(composition.values())
+    z = 2.0 * n_pairs / n_sites
+    alpha = {}
+    for t1 in sorted(composition):
+        for t2 in sorted(composition):
+            if t2 < t1:
+                continue
+            expected = composition[t1] * z * composition[t2] / n_sites
+            if t1 == t2:
+                expected /= 2
+            alpha[(t1, t2)] = 1.0 - counts.get((t1, t2), 0) / expected if expected else 0.0
+    return alpha
+
+def shell_pair_targets(targets, composition, n_pairs):
+    """Pair-count targets for one shell from a count dict or {"alpha": {...}}."""
+    if "alpha" in targets:
+        return wc_alpha_to_pair_targets(targets["alpha"], composition, n_pairs)
+    return dict(targets)
+
 def total_bonds_from_pairs(pairs):
     return len(pairs)
 
+# ==========================
+# ARRAY BOND-COUNT ENGINE
+# ==========================
+# Integer types are mapped to dense indices 0..K-1. Unordered pair counts live in a
+# symmetric (K, K) matrix and every site keeps a histogram of its neighbor types, so a
+# swap only needs two histogram rows instead of walking the neighbor lists.
+# Several neighbor shells are handled by stacking these arrays along a leading shell
+# axis: counts/target/mask (S, K, K), hist (S, n_sites, K), indptr (S, n_sites + 1).
+# Single-shell callers keep passing a pairs array, 1D indptr and a target dict.
+
+def build_type_index(types, targ_counts):
+    """Return (type_values, tix): sorted type values and types as dense indices."""
+    values = set(np.unique(types).tolist())
+    for t1, t2 in targ_counts:
+        values.update((int(t1), int(t2)))
+    type_values = np.array(sorted(values), dtype=np.int64)
+    tix = np.searchsorted(type_values, types).astype(np.int64)
+    return type_values, tix
+
+def init_count_matrix(tix, pairs, n_types):
+    """Return dense symmetric (n_types, n_types) matrix of unordered pair counts."""
+    ta, tb = tix[pairs[:, 0]], tix[pairs[:, 1]]
+    lo, hi = np.minimum(ta, tb), np.maximum(ta, tb)
+    upper = np.bincount(lo * n_types + hi, minlength=n_types * n_types).reshape(n_types, n_types)
+    return upper + np.triu(upper, 1).T
+
+def target_matrices(targ_counts, type_values):
+    """Return symmetric (target, mask) matrices; mask marks the targeted pairs."""
+    n_types = len(type_values)
+    target = np.zeros((n_types, n_types), dtype=np.int64)
+    mask = np.zeros((n_types, n_types), dtype=np.int64)
+    for (t1, t2), targ in targ_counts.items():
+        a, b = np.searchsorted(type_values, [t1, t2])
+        target[a, b] = target[b, a] = targ
+        mask[a, b] = mask[b, a] = 1
+    return target, mask
+
+def neighbor_type_histogram(tix, indptr, indices, n_types):
+    """Return (n_sites, n_types) array: number of neighbors of each type per site."""
+    n_sites = len(indptr) - 1
+    rows = np.repeat(np.arange(n_sites, dtype=np.int64), np.diff(indptr))
+    nbrs = indices[indptr[0]:indptr[-1]]
+    flat = np.bincount(rows * n_types + tix[nbrs], minlength=n_sites * n_types)
+    return flat.reshape(n_sites, n_types)
+
+def _as_shells(pairs, neigh, targ_counts):
+    """Normalize single-shell inputs to the stacked form: (pairs_list, indptr 2D, indices, targ_list)."""
+    pairs_list = [pairs] if isinstance(pairs, np.ndarray) else list(pairs)
+    indptr, indices = neigh
+    targ_list = [targ_counts] if isinstance(targ_counts, dict) else list(targ_counts)
+    return pairs_list, np.atleast_2d(indptr), indices, targ_list
+
+def _shell_state(tix, pairs_list, indptr, indices, n_types):
+    """Return stacked (counts, hist) for the configuration tix."""
+    counts = np.stack([init_count_matrix(tix, pairs, n_types) for pairs in pairs_list])
+    hist = np.stack([neighbor_type_histogram(tix, ip, indices, n_types) for ip in indptr])
+    return counts, hist
+
+def _weighted_cost(counts, target, mask, weights, squared=True):
+    """Sum over shells of weight * (squared or L1) residual over the targeted pairs."""
+    resid = counts - target
+    per_shell = np.sum(np.triu(mask * (resid ** 2 if squared else np.abs(resid))), axis=(1, 2))
+    return sum(w * int(c) for w, c in zip(weights, per_shell))
+
+def _build_engine(types, pairs, targ_counts, neigh, weights=None):
+    """Return a dict with the stacked engine arrays for `types`."""
+    pairs_list, indptr, indices, targ_list = _as_shells(pairs, neigh, targ_counts)
+    type_values, tix = build_type_index(types, [key for targ in targ_list for key in targ])
+    n_types = len(type_values)
+    counts, hist = _shell_state(tix, pairs_list, indptr, indices, n_types)
+    matrices = [target_matrices(targ, type_values) for targ in targ_list]
+    return {"type_values": type_values, "tix": tix, "counts": counts, "hist": hist,
+            "target": np.stack([t for t, _ in matrices]), "mask": np.stack([m for _, m in matrices]),
+            "indptr": indptr, "indices": indices, "pairs_list": pairs_list,
+            "weights": list(weights) if weights is not None else [1] * len(pairs_list),
+            "single": isinstance(targ_counts, dict)}
+
+def _counts_out(counts, engine):
+    """Stacked counts -> dict (single-shell input) or list of per-shell dicts."""
+    dicts = [count_matrix_to_dict(c, engine["type_values"]) for c in counts]
+    return dicts[0] if engine["single"] else dicts
+
+def count_matrix_to_dict(counts, type_values):
+    """Return {(t1, t2): count} with t1 <= t2 for every nonzero unordered pair."""
+    out = {}
+    for a, b in zip(*np.triu_indices(len(type_values))):
+        if counts[a, b]:
+            out[(int(type_values[a]), int(type_values[b]))] = int(counts[a, b])
+    return out
+
+def _swap_neighbor_delta(i, j, a, b, rows, indptr, indices, d):
+    """
+    Fill the preallocated list d with (neighbor types of j) - (neighbor types of i),
+    excluding the i-j bond, and return it. rows/indptr/indices are the list mirrors from
+    _list_shells. Swapping types a (at i) and b (at j) changes pair {a,c} by +d[c] and
+    {b,c} by -d[c] for c not in {a,b}, {a,a} by +d[a], {b,b} by -d[b] and {a,b} by d[b] - d[a].
+    """
+    row_j, row_i = rows[j], rows[i]
+    for c in range(len(d)):
+        d[c] = row_j[c] - row_i[c]
+    lo, hi = indptr[i], indptr[i + 1]
+    k = bisect_left(indices, j, lo, hi)
+    if k < hi and indices[k] == j:
+        d[b] += 1
+        d[a] -= 1
+    return d
+
+def _swap_pair_changes(a, b, d, n_types):
+    """Yield (x, y, change) for the unordered pairs touched by a swap."""
+    for c in range(n_types):
+        if c != b:
+            yield a, c, d[c]
+        if c != a:
+            yield b, c, -d[c]
+    yield a, b, d[b] - d[a]
+
+def _apply_swap(i, j, a, b, d, counts, rows, indptr, indices):
+    """Commit the swap of sites i (type a) and j (type b) to one shell's counts and list histogram (not tix)."""
+    for x, y, change in _swap_pair_changes(a, b, d, counts.shape[0]):
+        counts[x, y] += change
+        if x != y:
+            counts[y, x] += change
+    for k in range(indptr[i], indptr[i + 1]):
+        row = rows[indices[k]]
+        row[a] -= 1
+        row[b] += 1
+    for k in range(indptr[j], indptr[j + 1]):
+        row = rows[indices[k]]
+        row[b] -= 1
+        row[a] += 1
+
+def _list_shells(eng):
+    """
+    Per-shell (rows, indptr, indices, mask_rows, weight) for the python backend: the
+    neighbor-type histogram and CSR arrays as plain lists, so a proposed swap reads list
+    items instead of creating NumPy temporaries.
+    """
+    indices = eng["indices"].tolist()
+    return [(hist.tolist(), indptr.tolist(), indices, mask.tolist(), w)
+            for hist, indptr, mask, w in zip(eng["hist"], eng["indptr"], eng["mask"], eng["weights"])]
+
+def _sq_cost_delta(a, b, d, resid, mask):
+    """Change of the squared cost for a swap; resid/mask are (counts - target)/mask as lists."""
+    ra, rb, ma, mb = resid[a], resid[b], mask[a], mask[b]
+    delta = 0
+    for c in range(len(d)):
+        dc = d[c]
+        if dc:
+            if c != b and ma[c]:
+                delta += dc * (2 * ra[c] + dc)
+            if c != a and mb[c]:
+                delta += dc * (dc - 2 * rb[c])
+    dab = d[b] - d[a]
+    if ma[b]:
+        delta += dab * (2 * ra[b] + dab)
+    return delta
+
+def _l1_cost_delta(a, b, d, resid, mask):
+    """Change of the L1 residual for a swap; resid/mask are (counts - target)/mask as lists."""
+    ra, rb, ma, mb = resid[a], resid[b], mask[a], mask[b]
+    delta = 0
+    for c in range(len(d)):
+        dc = d[c]
+        if dc:
+            if c != b and ma[c]:
+                delta += abs(ra[c] + dc) - abs(ra[c])
+            if c != a and mb[c]:
+                delta += abs(rb[c] - dc) - abs(rb[c])
+    dab = d[b] - d[a]
+    if ma[b]:
+        delta += abs(ra[b] + dab) - abs(ra[b])
+    return delta
+
+# ==========================
+# COMPILED KERNELS (optional, numba)
+# ==========================
+# Same move set and cost as the Python loops, but the whole inner loop (partner
+# selection, neighbor delta, Metropolis test, best-state tracking) runs compiled.
+# The kernels draw from the Generator in a different order, so trajectories differ
+# from the Python backend for the same RNG_SEED.
+
+def _jit(fn):
+    """Compile fn with numba when available; otherwise leave it as plain Python."""
+    return njit(cache=True)(fn) if njit is not None else fn
+
+@_jit
+def _kernel_partner(i, a, tix, rng, n_tries):
+    """Return a random site j != i with a type other than a, or -1 if none exists."""
+    n = tix.shape[0]
+    for _ in range(n_tries):
+        j = rng.integers(0, n)
+        if j != i and tix[j] != a:
+            return j
+    start = rng.integers(0, n)
+    for k in range(n):
+        j = (start + k) % n
+        if j != i and tix[j] != a:
+            return j
+    return -1
+
+@_jit
+def _kernel_swap_delta(i, j, a, b, hist, indptr, indices, d):
+    """Fill d like _swap_neighbor_delta."""
+    for c in range(d.shape[0]):
+        d[c] = hist[j, c] - hist[i, c]
+    for k in range(indptr[i], indptr[i + 1]):
+        if indices[k] == j:
+            d[b] += 1
+            d[a] -= 1
+            break
+
+@_jit
+def _kernel_cost_delta(a, b, d, counts, target, mask, squared):
+    """Change of the squared (or L1) cost over the targeted pairs for a swap."""
+    delta = 0
+    for c in range(d.shape[0]):
+        dc = d[c]
+        if dc == 0:
+            continue
+        if c != b and mask[a, c]:
+            r = counts[a, c] - target[a, c]
+            delta += dc * (2 * r + dc) if squared else abs(r + dc) - abs(r)
+        if c != a and mask[b, c]:
+            r = counts[b, c] - target[b, c]
+            delta += dc * (dc - 2 * r) if squared else abs(r - dc) - abs(r)
+    dab = d[b] - d[a]
+    if mask[a, b]:
+        r = counts[a, b] - target[a, b]
+        delta += dab * (2 * r + dab) if squared else abs(r + dab) - abs(r)
+    return delta
+
+@_jit
+def _kernel_apply_swap(i, j, a, b, d, counts, hist, indptr, indices):
+    """Compiled counterpart of _apply_swap (one shell; tix is swapped by the caller)."""
+    for c in range(d.shape[0]):
+        if c != b:
+            counts[a, c] += d[c]
+            if c != a:
+                counts[c, a] += d[c]
+        if c != a:
+            counts[b, c] -= d[c]
+            if c != b:
+                counts[c, b] -= d[c]
+    dab = d[b] - d[a]
+    counts[a, b] += dab
+    counts[b, a] += dab
+    for k in range(indptr[i], indptr[i + 1]):
+        hist[indices[k], a] -= 1
+        hist[indices[k], b] += 1
+    for k in range(indptr[j], indptr[j + 1]):
+        hist[indices[k], b] -= 1
+        hist[indices[k], a] += 1
+
+@_jit
+def _kernel_shell_delta(i, j, a, b, hist, indptr, indices, counts, target, mask, weights, d, squared):
+    """Fill d (n_shells, n_types) for a swap and return the weighted cost change over all shells."""
+    delta = 0.0
+    for s in range(counts.shape[0]):
+        _kernel_swap_delta(i, j, a, b, hist[s], indptr[s], indices, d[s])
+        delta += weights[s] * _kernel_cost_delta(a, b, d[s], counts[s], target[s], mask[s], squared)
+    return delta
+
+@_jit
+def _kernel_commit(i, j, a, b, d, tix, counts, hist, indptr, indices):
+    """Apply an accepted swap to every shell and to tix."""
+    for s in range(counts.shape[0]):
+        _kernel_apply_swap(i, j, a, b, d[s], counts[s], hist[s], indptr[s], indices)
+    tix[i] = b
+    tix[j] = a
+
+@_jit
+def _sa_kernel(tix, indptr, indices, hist, counts, target, mask, weights, best_tix, best_counts,
+               stats, costs, step_start, step_end, n_steps, T0, T_final, stop_cost, rng):
+    """
+    Run SA steps step_start..step_end (inclusive) in place; stop early once the
+    cost is <= stop_cost (disabled when negative). Returns the last step run.
+    Arrays carry the leading shell axis. stats = [attempted, accepted, rejected],
+    costs = [current, best] (float64, weighted over shells).
+    """
+    d = np.zeros((counts.shape[0], counts.shape[1]), dtype=np.int64)
+    cur = costs[0]
+    best = costs[1]
+    # the best state is only copied out when a move leaves it, so runs of
+    # consecutive improvements cost no O(n_sites) snapshots
+    at_best = cur == best
+    for step in range(step_start, step_end + 1):
+        T = T0 * (T_final / T0) ** (step / n_steps)
+        i = rng.integers(0, tix.shape[0])
+        a = tix[i]
+        j = _kernel_partner(i, a, tix, rng, 6)
+        if j < 0:
+            continue
+        stats[0] += 1
+        b = tix[j]
+        delta_cost = _kernel_shell_delta(i, j, a, b, hist, indptr, indices, counts, target, mask,
+                                         weights, d, True)
+        if delta_cost <= 0 or rng.random() < math.exp(-delta_cost / max(T, 1e-12)):
+            if at_best and delta_cost >= 0:
+                best_tix[:] = tix
+                best_counts[:, :, :] = counts
+            _kernel_commit(i, j, a, b, d, tix, counts, hist, indptr, indices)
+            cur += delta_cost
+            stats[1] += 1
+            at_best = cur < best
+            if cur < best:
+                best = cur
+            if cur <= stop_cost:
+                step_end = step
+                break
+        else:
+            stats[2] += 1
+    if at_best:
+        best_tix[:] = tix
+        best_counts[:, :, :] = counts
+    costs[0] = cur
+    costs[1] = best
+    return step_end
+
+@_jit
+def _greedy_kernel(tix, indptr, indices, hist, counts, target, mask, weights, max_no_improve,
+                   score, stop_score, rng):
+    """
+    Strict-improvement L1 search in place, starting from `score` and stopping at
+    stop_score (disabled when negative); returns (tries, total score change).
+    """
+    d = np.zeros((counts.shape[0], counts.shape[1]), dtype=np.int64)
+    no_improve = 0
+    iters = 0
+    total = 0.0
+    while no_improve < max_no_improve and score + total > stop_score:
+        iters += 1
+        i = rng.integers(0, tix.shape[0])
+        a = tix[i]
+        j = _kernel_partner(i, a, tix, rng, 8)
+        if j < 0:
+            break
+        b = tix[j]
+        delta_score = _kernel_shell_delta(i, j, a, b, hist, indptr, indices, counts, target, mask,
+                                          weights, d, False)
+        if delta_score < 0:
+            _kernel_commit(i, j, a, b, d, tix, counts, hist, indptr, indices)
+            total += delta_score
+            no_improve = 0
+        else:
+            no_improve += 1
+    return iters, total
+
+def adaptive_settings():
+    """Adaptive-SA settings from the USER INPUTS block, or None if SA_ADAPTIVE is off."""
+    if not SA_ADAPTIVE:
+        return None
+    return {"stop_cost": SA_STOP_COST, "accept_start": SA_ACCEPT_START, "accept_end": SA_ACCEPT_END,
+            "window": SA_ADAPT_WINDOW, "stall_steps": SA_STALL_STEPS}
+
+def _adapt_temperature(T, step, n_steps, win_attempted, win_accepted, steps_since_best,
+                       T0, T_final, adaptive):
+    """
+    One adaptive-SA window update. Returns (T, reheated): T is reset to T0 after a
+    stall, otherwise scaled (x0.5..x2, bounded by T_final..T0) toward the target
+    acceptance rate for this point of the run.
+    """
+    if steps_since_best >= adaptive["stall_steps"]:
+        return T0, True
+    start, end = adaptive["accept_start"], adaptive["accept_end"]
+    target_rate = start * (end / start) ** (step / n_steps)
+    rate = win_accepted / win_attempted if win_attempted else 0.0
+    factor = min(2.0, max(0.5, math.exp(0.5 * (target_rate - rate) / target_rate)))
+    return min(T0, max(T_final, T * factor)), False
+
+def _use_numba(backend):
+    """True if the compiled kernels should run for this backend setting."""
+    if backend == "python":
+        return False
+    if backend != "numba":
+        raise ValueError(f"Unknown backend '{backend}' (use 'python' or 'numba')")
+    if njit is None:
+        print("numba is not installed; falling back to the python backend.")
+        return False
+    return True
+
+def _simulated_annealing_numba(types, pairs, targ_counts, neigh, n_steps, T0, T_final,
+                               print_every, rng, adaptive=None, weights=None):
+    """Compiled-kernel version of simulated_annealing_swaps (same return values)."""
+    eng = _build_engine(types, pairs, targ_counts, neigh, weights)
+    type_values, tix, counts, hist = eng["type_values"], eng["tix"], eng["counts"], eng["hist"]
+    target, mask, indptr, indices = eng["target"], eng["mask"], eng["indptr"], eng["indices"]
+    w = np.asarray(eng["weights"], dtype=np.float64)
+    cost = _weighted_cost(counts, target, mask, eng["weights"])
+    costs = np.array([cost, cost], dtype=np.float64)
+    stats = np.zeros(3, dtype=np.int64)
+    best_tix = tix.copy()
+    best_counts = counts.copy()
+
+    t0 = time.time()
+    step = 1
+    T = T0
+    stop_cost = adaptive["stop_cost"] if adaptive else -1
+    last_best_step = 0
+    reheats = 0
+    steps_run = n_steps
+    while step <= n_steps:
+        if adaptive:
+            # one adaptation window at constant T
+            step_end = min(n_steps, step + adaptive["window"] - 1)
+            att0, acc0, best0 = int(stats[0]), int(stats[1]), costs[1]
+            last = _sa_kernel(tix, indptr, indices, hist, counts, target, mask, w, best_tix, best_counts,
+                              stats, costs, step, step_end, n_steps, T, T, stop_cost, rng)
+            if costs[1] < best0:
+                last_best_step = last
+            if costs[0] <= stop_cost:
+                steps_run = last
+            else:
+                T, reheated = _adapt_temperature(T, last, n_steps, int(stats[0]) - att0, int(stats[1]) - acc0,
+                                                 last - last_best_step, T0, T_final, adaptive)
+                if reheated:
+                    reheats += 1
+                    last_best_step = last
+        else:
+            # run up to the next progress line inside the kernel
+            step_end = min(n_steps, (step // print_every + 1) * print_every)
+            last = _sa_kernel(tix, indptr, indices, hist, counts, target, mask, w, best_tix, best_counts,
+                              stats, costs, step, step_end, n_steps, T0, T_final, stop_cost, rng)
+            T = T0 * (T_final / T0) ** (step_end / n_steps)
+        if last // print_every != (step - 1) // print_every or last == steps_run:
+            attempted, accepted = int(stats[0]), int(stats[1])
+            acc_rate = accepted / attempted if attempted else 0.0
+            print(f"SA step {last}/{n_steps}, T={T:.4f}, cost={float(costs[0]):.1f}, best={float(costs[1]):.1f}, "
+                  f"attempted={attempted}, accepted={accepted}, acc_rate={acc_rate:.3f}, time={time.time() - t0:.1f}s")
+        if last == steps_run:
+            break
+        step = last + 1
+
+    stats = {"attempted": int(stats[0]), "accepted": int(stats[1]), "rejected": int(stats[2])}
+    if adaptive:
+        stats.update({"steps_run": steps_run, "steps_saved": n_steps - steps_run, "reheats": reheats})
+    best_types = type_values[best_tix].astype(types.dtype)
+    return best_types, float(costs[1]), stats, _counts_out(best_counts, eng)
+
+def _greedy_random_local_search_numba(types, pairs, neigh, targ_counts, max_no_improve_iters, rng,
+                                      stop_score=None, weights=None):
+    """Compiled-kernel version of greedy_random_local_search (same return values)."""
+    eng = _build_engine(types, pairs, targ_counts, neigh, weights)
+    type_values, tix, counts = eng["type_values"], eng["tix"], eng["counts"]
+    score = _weighted_cost(counts, eng["target"], eng["mask"], eng["weights"], squared=False)
+    iters, change = _greedy_kernel(tix, eng["indptr"], eng["indices"], eng["hist"], counts, eng["target"],
+                                   eng["mask"], np.asarray(eng["weights"], dtype=np.float64),
+                                   max_no_improve_iters, score, -1 if stop_score is None else stop_score, rng)
+    print(f"Greedy finished after {iters} tries. best L1 residual = {score + change:g}")
+    types[:] = type_values[tix]
+    return types.copy(), _counts_out(counts, eng)
+
+# ==========================
+# WARM-START INITIALIZER
+# ==========================
+@_jit
+def _greedy_construct_kernel(order, indptr, indices, quota, target, mask, noise):
+    """
+    Assign dense types to sites in `order`. Each site takes the type (with quota left)
+    whose new bonds to already-assigned neighbors keep the partial pair counts closest
+    to the target scaled by the fraction of bonds placed so far. noise breaks ties.
+    """
+    n_sites = indptr.shape[0] - 1
+    n_types = quota.shape[0]
+    tix = np.full(n_sites, -1, dtype=np.int64)
+    counts = np.zeros((n_types, n_types), dtype=np.int64)
+    h = np.zeros(n_types, dtype=np.int64)
+    n_bonds_total = indices.shape[0] // 2
+    placed = 0
+    for k in range(n_sites):
+        s = order[k]
+        h[:] = 0
+        for p in range(indptr[s], indptr[s + 1]):
+            if tix[indices[p]] >= 0:
+                h[tix[indices[p]]] += 1
+        new_bonds = 0
+        for c in range(n_types):
+            new_bonds += h[c]
+        frac = (placed + new_bonds) / max(n_bonds_total, 1)
+        best_t = -1
+        best_score = 0.0
+        for t in range(n_types):
+            if quota[t] == 0:
+                continue
+            score = noise[k, t]
+            for c in range(n_types):
+                if mask[t, c] and h[c]:
+                    r = counts[t, c] - frac * target[t, c]
+                    score += h[c] * (2.0 * r + h[c])
+            if best_t < 0 or score < best_score:
+                best_t = t
+                best_score = score
+        tix[s] = best_t
+        quota[best_t] -= 1
+        for c in range(n_types):
+            if h[c]:
+                counts[best_t, c] += h[c]
+                if c != best_t:
+                    counts[c, best_t] += h[c]
+        placed += new_bonds
+    return tix
+
+def greedy_types_from_composition(n_sites, composition, targ_counts, pairs, neigh, rng):
+    """
+    Warm start: int array of types respecting composition whose pair counts are
+    already close to targ_counts. Sites are assigned greedily in breadth-first order
+    from a random site, so each new site already has assigned neighbors to match.
+    With several shells only the first (nearest-neighbor) shell guides the assignment.
+    """
+    _, indptr, indices, targ_list = _as_shells(pairs, neigh, targ_counts)
+    targ_counts = targ_list[0]
+    indptr, indices = indptr[0] - indptr[0, 0], indices[indptr[0, 0]:indptr[0, -1]]
+    values = sorted(set(int(t) for t in composition) | {int(t) for targ in targ_list for p in targ for t in p})
+    type_values = np.array(values, dtype=np.int64)
+    quota = np.zeros(len(type_values), dtype=np.int64)
+    for t, n in composition.items():
+        quota[np.searchsorted(type_values, int(t))] = int(n)
+    assert quota.sum() == n_sites, "Composition does not match number of sites"
+    target, mask = target_matrices(targ_counts, type_values)
+    graph = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n_sites, n_sites))
+    order = breadth_first_order(graph, int(rng.integers(0, n_sites)), directed=False,
+                                return_predecessors=False)
+    if len(order) < n_sites:
+        # disconnected neighbor graph: remaining sites follow in random order
+        rest = np.setdiff1d(np.arange(n_sites), order)
+        order = np.concatenate([order, rng.permutation(rest)])
+    order = order.astype(np.int64)
+    noise = rng.random((n_sites, len(type_values))) * 1e-3
+    tix = _greedy_construct_kernel(order, indptr, indices, quota, target, mask, noise)
+    return type_values[tix].astype(int)
+
+def initial_types(method, n_sites, composition, targ_counts, pairs, neigh, rng):
+    """Starting configuration for INIT_METHOD ("random" or "greedy")."""
+    if method == "random":
+        return random_types_from_composition(n_sites, composition, rng)
+    if method == "greedy":
+        return greedy_types_from_composition(n_sites, composition, targ_counts, pairs, neigh, rng)
+    raise ValueError(f"Unknown INIT_METHOD '{method}' (use 'random' or 'greedy')")
+
 # ==========================
 # SIMULATED ANNEALING (local updates)
 # ==========================
 def simulated_annealing_swaps(types, pairs, targ_counts, neigh,
                               n_steps=200000, T0=2.0, T_final=0.01,
-                              print_every=20000, rng=None):
+                              print_every=20000, rng=None, backend="python", adaptive=None,
+                              weights=None):
     """
     Simulated annealing swapping with local bond-count updates.
-    Returns best_types, best_cost, stats, best_counts
+    `neigh` is the (indptr, indices) CSR pair from build_csr_adjacency.
+    `adaptive` (see adaptive_settings) switches the fixed exponential schedule to the
+    early-stopping, acceptance-steered schedule with reheats.
+    For several neighbor shells pass lists of pairs and targets and the stacked `neigh`
+    from stack_shell_topologies; the cost is the `weights`-weighted sum over shells.
+    Returns best_types, best_cost, stats, best_counts (a list of dicts for several shells)
     """
     if rng is None:
         rng = np.random.default_rng()
+    if _use_numba(backend):
+        return _simulated_annealing_numba(types, pairs, targ_counts, neigh, n_steps, T0, T_final,
+                                          print_every, rng, adaptive, weights)
 
     n_sites = len(types)
-    counts = init_counts_from_pairs(types, pairs)
-
-    def cost_fn(cnts):
-        c = 0.0
-        for pair, targ in targ_counts.items():
-            c += (cnts.get(pair, 0) - targ) ** 2
-        return c
+    eng = _build_engine(types, pairs, targ_counts, neigh, weights)
+    type_values, tix, counts, target, mask = (eng["type_values"], eng["tix"], eng["counts"],
+                                              eng["target"], eng["mask"])
+    w = eng["weights"]
+    # per-shell list mirrors and reusable d buffers; residual rows refreshed on accept only
+    shells = _list_shells(eng)
+    ds = [[0] * len(type_values) for _ in shells]
+    resid_rows = (counts - target).tolist()
 
-    current_cost = cost_fn(counts)
+    current_cost = float(_weighted_cost(counts, target, mask, w))
     best_cost = current_cost
-    best_types = types.copy()
+    best_tix = tix.copy()
     best_counts = counts.copy()
 
     attempted = accepted = rejected = 0
     t0 = time.time()
+    T = T0
+    win_attempted = win_accepted = last_best_step = reheats = 0
+    steps_run = n_steps
 
     for step in range(1, n_steps + 1):
-        frac = step / n_steps
-        # exponential schedule
-        T = T0 * (T_final / T0) ** frac
+        if adaptive is None:
+            frac = step / n_steps
+            # exponential schedule
+            T = T0 * (T_final / T0) ** frac
+        elif step % adaptive["window"] == 0:
+            T, reheated = _adapt_temperature(T, step, n_steps, attempted - win_attempted,
+                                             accepted - win_accepted, step - last_best_step,
+                                             T0, T_final, adaptive)
+            win_attempted, win_accepted = attempted, accepted
+            if reheated:
+                reheats += 1
+                last_best_step = step
 
         # pick site i uniformly
         i = int(rng.integers(0, n_sites))
-        ti = types[i]
+        a = tix[i]
 
         # attempt to find j with different type quickly
         found = False
         for _ in range(6):
             j = int(rng.integers(0, n_sites))
-            if j != i and types[j] != ti:
+            if j != i and tix[j] != a:
                 found = True
                 break
         if not found:
             # fallback: sample subset
             sample = rng.choice(n_sites, size=min(50, n_sites), replace=False)
             for jj in sample:
-                if jj != i and types[jj] != ti:
+                if jj != i and tix[jj] != a:
                     j = int(jj); found = True; break
         if not found:
             continue
 
         attempted += 1
-        tj = types[j]
-
-        # compute delta counts for neighbors of i and j (excluding cross pair handled implicitly)
-        delta = Counter()
-        # process neighbors excluding the other swapped site to avoid double count
-        for s, t_old, t_new in ((i, ti, tj), (j, tj, ti)):
-            for nb in neigh[s]:
-                if nb == i or nb == j:
-                    continue
-                tnb = types[nb]
-                key_before = (t_old, tnb) if t_old <= tnb else (tnb, t_old)
-                key_after  = (t_new, tnb) if t_new <= tnb else (tnb, t_new)
-                delta[key_before] -= 1
-                delta[key_after]  += 1
-
-        # note: i-j unordered pair doesn't change count when swapping different types (still one bond of that unordered pair),
-        # so we don't need to modify delta for i-j.
-
-        # compute new cost using only affected keys (sparse update)
-        affected = set(delta.keys()) | set(targ_counts.keys())
-        new_cost = current_cost
-        for key in affected:
-            old = counts.get(key, 0)
-            new = old + delta.get(key, 0)
-            old_term = (old - targ_counts.get(key, 0)) ** 2
-            new_term = (new - targ_counts.get(key, 0)) ** 2
-            new_cost += (new_term - old_term)
-
-        delta_cost = new_cost - current_cost
+        a = int(a)
+        b = int(tix[j])
+
+        # neighbor-type difference of j and i per shell; the i-j bond itself keeps its unordered pair
+        delta_cost = 0
+        for d, resid, (rows, indptr, indices, mask_rows, ws) in zip(ds, resid_rows, shells):
+            _swap_neighbor_delta(i, j, a, b, rows, indptr, indices, d)
+            delta_cost += ws * _sq_cost_delta(a, b, d, resid, mask_rows)
+        new_cost = current_cost + delta_cost
 
         # metropolis acceptance
         if delta_cost <= 0 or rng.random() < math.exp(-delta_cost / max(T, 1e-12)):
             # accept
-            types[i], types[j] = types[j], types[i]
-            # apply delta
-            for k, v in delta.items():
-                counts[k] = counts.get(k, 0) + v
+            for s, (rows, indptr, indices, _, _) in enumerate(shells):
+                _apply_swap(i, j, a, b, ds[s], counts[s], rows, indptr, indices)
+            tix[i], tix[j] = b, a
+            resid_rows = (counts - target).tolist()
             current_cost = new_cost
             accepted += 1
             if current_cost < best_cost:
                 best_cost = current_cost
-                best_types = types.copy()
+                best_tix = tix.copy()
                 best_counts = counts.copy()
+                last_best_step = step
+            if adaptive is not None and current_cost <= adaptive["stop_cost"]:
+                steps_run = step
         else:
             rejected += 1
 
-        if step % print_every == 0 or step == 1:
+        if step % print_every == 0 or step == 1 or steps_run == step:
             elapsed = time.time() - t0
             acc_rate = accepted / attempted if attempted else 0.0
             print(f"SA step {step}/{n_steps}, T={T:.4f}, cost={current_cost:.1f}, best={best_cost:.1f}, "
                   f"attempted={attempted}, accepted={accepted}, acc_rate={acc_rate:.3f}, time={elapsed:.1f}s")
+        if steps_run == step:
+            break
 
     stats = {"attempted": attempted, "accepted": accepted, "rejected": rejected}
-    return best_types, best_cost, stats, best_counts
+    if adaptive is not None:
+        stats.update({"steps_run": steps_run, "steps_saved": n_steps - steps_run, "reheats": reheats})
+    best_types = type_values[best_tix].astype(types.dtype)
+    return best_types, best_cost, stats, _counts_out(best_counts, eng)
 
 # ==========================
 # GREEDY LOCAL SEARCH (reduces L1 residual)
 # ==========================
 def total_l1_residual(counts, targ_counts):
+    if not isinstance(targ_counts, dict):
+        return sum(total_l1_residual(c, t) for c, t in zip(counts, targ_counts))
     s = 0
     for pair, targ in targ_counts.items():
         s += abs(counts.get(pair, 0) - targ)
     return s
 
-def greedy_random_local_search(types, pairs, neigh, targ_counts, counts,
-                               max_no_improve_iters=100000, rng=None):
-    """Randomized greedy local search: accept only strict L1 improvements."""
+def greedy_random_local_search(types, pairs, neigh, targ_counts,
+                               max_no_improve_iters=100000, rng=None, backend="python",
+                               stop_score=None, weights=None):
+    """
+    Randomized greedy local search: accept only strict L1 improvements.
+    Stops early once the L1 residual is <= stop_score (if given).
+    Several shells are handled as in simulated_annealing_swaps (weighted L1).
+    """
     if rng is None:
         rng = np.random.default_rng()
+    if _use_numba(backend):
+        return _greedy_random_local_search_numba(types, pairs, neigh, targ_counts,
+                                                 max_no_improve_iters, rng, stop_score, weights)
     n = len(types)
-    cur_counts = counts.copy()
-    cur_score = total_l1_residual(cur_counts, targ_counts)
+    eng = _build_engine(types, pairs, targ_counts, neigh, weights)
+    type_values, tix, cur_counts, target, mask = (eng["type_values"], eng["tix"], eng["counts"],
+                                                  eng["target"], eng["mask"])
+    w = eng["weights"]
+    shells = _list_shells(eng)
+    ds = [[0] * len(type_values) for _ in shells]
+    resid_rows = (cur_counts - target).tolist()
+    cur_score = _weighted_cost(cur_counts, target, mask, w, squared=False)
     best_score = cur_score
-    best_types = types.copy()
+    best_tix = tix.copy()
     no_improve = 0
     iters = 0
 
-    while no_improve < max_no_improve_iters:
+    while no_improve < max_no_improve_iters and (stop_score is None or cur_score > stop_score):
         iters += 1
         # pick i and j of different types
         i = int(rng.integers(0, n))
-        ti = types[i]
+        a = tix[i]
         found = False
         for _ in range(8):
             j = int(rng.integers(0, n))
-            if j != i and types[j] != ti:
+            if j != i and tix[j] != a:
                 found = True
                 break
         if not found:
             for jj in rng.choice(n, size=min(50, n), replace=False):
-                if jj != i and types[jj] != ti:
+                if jj != i and tix[jj] != a:
                     j = int(jj); found = True; break
         if not found:
             break
 
-        tj = types[j]
-        delta = Counter()
-        for s, t_old, t_new in ((i, ti, tj), (j, tj, ti)):
-            for nb in neigh[s]:
-                if nb == i or nb == j:
-                    continue
-                tnb = types[nb]
-                kb = (t_old, tnb) if t_old <= tnb else (tnb, t_old)
-                ka = (t_new, tnb) if t_new <= tnb else (tnb, t_new)
-                delta[kb] -= 1
-                delta[ka] += 1
-
-        affected = set(delta.keys()) | set(targ_counts.keys())
-        new_score = cur_score
-        for key in affected:
-            old = cur_counts.get(key, 0)
-            new = old + delta.get(key, 0)
-            new_score += abs(new - targ_counts.get(key, 0)) - abs(old - targ_counts.get(key, 0))
-
-        if new_score < cur_score:
+        a = int(a)
+        b = int(tix[j])
+        delta_score = 0
+        for d, resid, (rows, indptr, indices, mask_rows, ws) in zip(ds, resid_rows, shells):
+            _swap_neighbor_delta(i, j, a, b, rows, indptr, indices, d)
+            delta_score += ws * _l1_cost_delta(a, b, d, resid, mask_rows)
+
+        if delta_score < 0:
             # accept
-            types[i], types[j] = types[j], types[i]
-            for k, v in delta.items():
-                cur_counts[k] = cur_counts.get(k, 0) + v
-            cur_score = new_score
+            for s, (rows, indptr, indices, _, _) in enumerate(shells):
+                _apply_swap(i, j, a, b, ds[s], cur_counts[s], rows, indptr, indices)
+            tix[i], tix[j] = b, a
+            resid_rows = (cur_counts - target).tolist()
+            cur_score += delta_score
             no_improve = 0
             if cur_score < best_score:
                 best_score = cur_score
-                best_types = types.copy()
+                best_tix = tix.copy()
         else:
             no_improve += 1
 
-    print(f"Greedy finished after {iters} tries. best L1 residual = {best_score}")
-    return best_types, cur_counts
+    print(f"Greedy finished after {iters} tries. best L1 residual = {best_score:g}")
+    types[:] = type_values[tix]
+    best_types = type_values[best_tix].astype(types.dtype)
+    return best_types, _counts_out(cur_counts, eng)
+
+# ==========================
+# PARALLEL TEMPERING (replica exchange)
+# ==========================
+# The bond topology (pairs and CSR arrays) and target matrices are placed in shared
+# memory once; pool workers attach to it in their initializer, so only the per-replica
+# type arrays and Generators travel between processes each exchange round.
+
+_PT_SHARED = {}
+
+def _share_arrays(arrays):
+    """Copy arrays into new shared-memory blocks; return (blocks, specs for workers)."""
+    blocks, specs = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        specs[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+def _pt_worker_init(specs, compiled):
+    """Pool initializer: attach read-only views of the shared topology arrays."""
+    _PT_SHARED["kernel"] = _sa_kernel if compiled else getattr(_sa_kernel, "py_func", _sa_kernel)
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        view.flags.writeable = False
+        _PT_SHARED[name] = (shm, view)
+
+def _pt_run_segment(args):
+    """Run n_steps fixed-temperature Metropolis steps for one replica (pool worker)."""
+    tix, T, n_steps, rng = args
+    pairs = _PT_SHARED["pairs"][1]
+    pair_ptr = _PT_SHARED["pair_ptr"][1]
+    indptr = _PT_SHARED["indptr"][1]
+    indices = _PT_SHARED["indices"][1]
+    target = _PT_SHARED["target"][1]
+    mask = _PT_SHARED["mask"][1]
+    weights = _PT_SHARED["weights"][1]
+    pairs_list = [pairs[pair_ptr[s]:pair_ptr[s + 1]] for s in range(len(pair_ptr) - 1)]
+    counts, hist = _shell_state(tix, pairs_list, indptr, indices, target.shape[1])
+    cost = _weighted_cost(counts, target, mask, weights.tolist())
+    costs = np.array([cost, cost], dtype=np.float64)
+    stats = np.zeros(3, dtype=np.int64)
+    best_tix = tix.copy()
+    best_counts = counts.copy()
+    _PT_SHARED["kernel"](tix, indptr, indices, hist, counts, target, mask, weights, best_tix, best_counts,
+               stats, costs, 1, n_steps, n_steps, T, T, -1, rng)
+    return tix, float(costs[0]), best_tix, float(costs[1]), stats, rng
+
+def parallel_tempering_swaps(types, pairs, targ_counts, neigh, n_replicas=8,
+                             T_min=0.05, T_max=5.0, n_steps=200000, exchange_every=20000,
+                             n_workers=None, rng=None, weights=None, backend="python"):
+    """
+    Replica-exchange version of simulated_annealing_swaps (also for several shells).
+    Segments run the SA kernel compiled with backend="numba" and as plain Python otherwise.
+    Every replica starts from `types` itself (so a greedy warm start is kept) and the
+    temperature ladder diversifies them. Returns best_types, best_cost, stats,
+    best_counts; stats holds per-replica move and exchange acceptance counts.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    compiled = _use_numba(backend)
+    eng = _build_engine(types, pairs, targ_counts, neigh, weights)
+    type_values, tix0, pairs_list = eng["type_values"], eng["tix"], eng["pairs_list"]
+    temps = np.geomspace(T_min, T_max, n_replicas)
+    replica_rngs = rng.spawn(n_replicas)
+    states = [tix0.copy() for _ in range(n_replicas)]
+    costs = [None] * n_replicas
+    moves = np.zeros((n_replicas, 3), dtype=np.int64)
+    exch_attempted = np.zeros(max(n_replicas - 1, 0), dtype=np.int64)
+    exch_accepted = np.zeros(max(n_replicas - 1, 0), dtype=np.int64)
+    best_cost, best_tix = math.inf, tix0.copy()
+
+    n_workers = min(n_workers or os.cpu_count() or 1, n_replicas)
+    n_rounds = max(1, math.ceil(n_steps / exchange_every))
+    blocks, specs = _share_arrays({
+        "pairs": np.concatenate(pairs_list),
+        "pair_ptr": np.cumsum([0] + [len(p) for p in pairs_list]),
+        "indptr": eng["indptr"], "indices": eng["indices"], "target": eng["target"], "mask": eng["mask"],
+        "weights": np.asarray(eng["weights"], dtype=np.float64)})
+    t0 = time.time()
+    try:
+        with Pool(n_workers, initializer=_pt_worker_init, initargs=(specs, compiled)) as pool:
+            done = 0
+            for rnd in range(n_rounds):
+                seg = min(exchange_every, n_steps - done)
+                results = pool.map(_pt_run_segment,
+                                   [(states[k], temps[k], seg, replica_rngs[k]) for k in range(n_replicas)])
+                done += seg
+                for k, (tix, cost, seg_best_tix, seg_best, seg_stats, r_rng) in enumerate(results):
+                    states[k], costs[k], replica_rngs[k] = tix, cost, r_rng
+                    moves[k] += seg_stats
+                    if seg_best < best_cost:
+                        best_cost, best_tix = seg_best, seg_best_tix
+
+                # exchange configurations between neighboring temperatures (alternate even/odd pairs)
+                for k in range(rnd % 2, n_replicas - 1, 2):
+                    exch_attempted[k] += 1
+                    arg = (1.0 / temps[k] - 1.0 / temps[k + 1]) * (costs[k] - costs[k + 1])
+                    if arg >= 0 or rng.random() < math.exp(arg):
+                        states[k], states[k + 1] = states[k + 1], states[k]
+                        costs[k], costs[k + 1] = costs[k + 1], costs[k]
+                        exch_accepted[k] += 1
+
+                print(f"PT round {rnd + 1}/{n_rounds}, steps/replica={done}, best={float(best_cost):.1f}, "
+                      f"costs={[round(c, 1) for c in costs]}, time={time.time() - t0:.1f}s")
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    stats = {"replicas": [], "exchanges": []}
+    for k in range(n_replicas):
+        attempted, accepted, rejected = (int(x) for x in moves[k])
+        stats["replicas"].append({"T": float(temps[k]), "attempted": attempted, "accepted": accepted,
+                                  "rejected": rejected,
+                                  "acc_rate": accepted / attempted if attempted else 0.0})
+    for k in range(n_replicas - 1):
+        stats["exchanges"].append({"T_pair": (float(temps[k]), float(temps[k + 1])),
+                                   "attempted": int(exch_attempted[k]), "accepted": int(exch_accepted[k])})
+    best_counts = np.stack([init_count_matrix(best_tix, p, len(type_values)) for p in pairs_list])
+    best_types = type_values[best_tix].astype(types.dtype)
+    return best_types, float(best_cost), stats, _counts_out(best_counts, eng)
+
+# ==========================
+# BATCH GENERATION
+# ==========================
+_BATCH_TOPOLOGY = {}
+
+def load_template(template_file, template_format):
+    """Read the template, creating the simple BCC one if allowed and missing."""
+    try:
+        return read(template_file, format=template_format)
+    except Exception:
+        if not CREATE_TEMPLATE_IF_MISSING:
+            raise
+        print(f"Template '{template_file}' not found or failed to read. Creating a simple template.")
+        create_simple_template(n_cells=SIMPLE_TEMPLATE_CELLS, symbol=SIMPLE_TEMPLATE_SYMBOL, out=template_file)
+        return read(template_file, format=template_format)
+
+def read_batch_table(path):
+    """
+    Read the batch CSV into a list of dicts with keys composition, target_bonds,
+    count and template. "1:341 2:341" -> {1: 341, 2: 341}; "1-2:413" -> {(1, 2): 413}.
+    """
+    rows = []
+    with open(path, newline="") as f:
+        for line in csv.DictReader(f):
+            comp = {}
+            for item in line["composition"].split():
+                t, n = item.split(":")
+                comp[int(t)] = int(n)
+            targets = {}
+            for item in line["target_bonds"].split():
+                key, n = item.split(":")
+                t1, t2 = sorted(int(t) for t in key.split("-"))
+                targets[(t1, t2)] = int(n)
+            rows.append({"composition": comp, "target_bonds": targets, "count": int(line["count"]),
+                         "template": (line.get("template") or "").strip() or TEMPLATE_FILE})
+    return rows
+
+def _batch_worker_init(topology):
+    """Pool initializer: keep the per-template atoms/pairs/CSR arrays in the worker."""
+    _BATCH_TOPOLOGY.update(topology)
+
+def _batch_run_one(task):
+    """Optimize and write one structure (pool worker); return its summary row."""
+    idx, row_id, template, comp, targets, seed, out_path = task
+    atoms, pairs, neigh = _BATCH_TOPOLOGY[template]
+    rng = np.random.default_rng(seed)
+    t0 = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        types = initial_types(INIT_METHOD, len(atoms), comp, targets, pairs, neigh, rng)
+        best_types, _, _, _ = simulated_annealing_swaps(
+            types, pairs, targets, neigh, n_steps=SA_N_STEPS, T0=SA_T0, T_final=SA_T_FINAL,
+            print_every=SA_N_STEPS, rng=rng, backend=BACKEND, adaptive=adaptive_settings())
+        final_types, final_counts = greedy_random_local_search(
+            best_types.copy(), pairs, neigh, targets,
+            max_no_improve_iters=GREEDY_MAX_NO_IMPROVE, rng=rng, backend=BACKEND,
+            stop_score=GREEDY_STOP_L1 if SA_ADAPTIVE else None)
+    atoms_new = atoms.copy()
+    atoms_new.set_chemical_symbols([type_to_symbol[int(t)] for t in final_types])
+    write(out_path, atoms_new, format=OUTPUT_FORMAT)
+    residuals = " ".join(f"{p[0]}-{p[1]}:{final_counts.get(p, 0) - t:+d}" for p, t in sorted(targets.items()))
+    return {"id": idx, "row": row_id, "template": template, "output": out_path,
+            "l1_residual": total_l1_residual(final_counts, targets),
+            "l2_cost": sum((final_counts.get(p, 0) - t) ** 2 for p, t in targets.items()),
+            "residuals": residuals, "time_s": round(time.time() - t0, 2)}
+
+def run_batch(rows, out_dir, n_workers=None, seed=None):
+    """
+    Generate sum(row["count"]) structures for the batch rows. Results are written as
+    they finish; returns the path of the CSV summary.
+    """
+    # fail before any template is read or compute is spent
+    if SHELLS:
+        raise ValueError("Batch mode optimizes the single CUTOFF shell; set SHELLS = None "
+                         "(per-shell targets are not supported in BATCH_TABLE)")
+    for row_id, row in enumerate(rows, start=1):
+        row_types = set(row["composition"]) | {t for pair in row["target_bonds"] for t in pair}
+        missing = sorted(row_types - set(type_to_symbol))
+        if missing:
+            raise ValueError(f"Batch row {row_id}: types {missing} have no entry in type_to_symbol")
+
+    os.makedirs(out_dir, exist_ok=True)
+    ext = os.path.splitext(OUTPUT_FILE)[1]
+
+    # neighbor topology once per template
+    topology = {}
+    for row in rows:
+        template = row["template"]
+        if template in topology:
+            continue
+        atoms = load_template(template, TEMPLATE_FORMAT)
+        pairs, neigh = load_or_build_topology(atoms, CUTOFF, TOPOLOGY_CACHE_DIR)
+        topology[template] = (atoms, pairs, neigh)
+        print(f"Template '{template}': {len(atoms)} sites, {len(pairs)} pairs (cutoff {CUTOFF} Å).")
+    for row_id, row in enumerate(rows, start=1):
+        n_sites = len(topology[row["template"]][0])
+        if sum(row["composition"].values()) != n_sites:
+            raise ValueError(f"Batch row {row_id}: composition sum {sum(row['composition'].values())} "
+                             f"!= number of sites {n_sites}")
+
+    tasks = []
+    for row_id, row in enumerate(rows, start=1):
+        for _ in range(row["count"]):
+            idx = len(tasks) + 1
+            out_path = os.path.join(out_dir, f"structure_{idx:05d}{ext}")
+            tasks.append([idx, row_id, row["template"], row["composition"], row["target_bonds"], None, out_path])
+    for task, child in zip(tasks, np.random.SeedSequence(seed).spawn(len(tasks))):
+        task[5] = child
+
+    summary_path = os.path.join(out_dir, "summary.csv")
+    fields = ["id", "row", "template", "output", "l1_residual", "l2_cost", "residuals", "time_s"]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    t0 = time.time()
+    with open(summary_path, "w", newline="") as f, \
+            Pool(n_workers, initializer=_batch_worker_init, initargs=(topology,)) as pool:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for done, result in enumerate(pool.imap_unordered(_batch_run_one, map(tuple, tasks)), start=1):
+            writer.writerow(result)
+            f.flush()
+            print(f"[{done}/{len(tasks)}] {result['output']}: L1 residual={result['l1_residual']}, "
+                  f"time={time.time() - t0:.1f}s")
+    print(f"Wrote {len(tasks)} structures to '{out_dir}' and summary to '{summary_path}'.")
+    return summary_path
 
 # ==========================
 # MAIN
 # ==========================
 def main():
+    if BATCH_TABLE:
+        run_batch(read_batch_table(BATCH_TABLE), BATCH_OUTPUT_DIR, n_workers=BATCH_N_WORKERS, seed=RNG_SEED)
+        return
+
+    # fail before any template is read or compute is spent
+    if PT_N_REPLICAS > 1 and SA_ADAPTIVE:
+        raise ValueError("SA_ADAPTIVE steers a single annealing schedule; parallel tempering uses "
+                         "fixed temperatures (set SA_ADAPTIVE = False or PT_N_REPLICAS = 0)")
+    if SHELLS and (shell_targets is None or len(shell_targets) != len(SHELLS)):
+        raise ValueError(f"SHELLS lists {len(SHELLS)} shells; shell_targets must give one target "
+                         f"dict per shell (got {None if shell_targets is None else len(shell_targets)})")
+    for s, shell_targ in enumerate(shell_targets if SHELLS else [target_bonds], start=1):
+        target_pairs = shell_targ["alpha"] if "alpha" in shell_targ else shell_targ
+        missing = sorted({int(t) for pair in target_pairs for t in pair} - set(composition))
+        if missing:
+            raise ValueError(f"Shell {s}: target pairs name types {missing} that are not in composition")
+
     rng = np.random.default_rng(RNG_SEED)
 
     # 1) Ensure template exists or create one
-    try:
-        atoms = read(TEMPLATE_FILE, format=TEMPLATE_FORMAT)
-    except Exception as e:
-        if CREATE_TEMPLATE_IF_MISSING:
-            print(f"Template '{TEMPLATE_FILE}' not found or failed to read. Creating a simple template.")
-            create_simple_template(n_cells=SIMPLE_TEMPLATE_CELLS, symbol=SIMPLE_TEMPLATE_SYMBOL, out=TEMPLATE_FILE)
-            atoms = read(TEMPLATE_FILE, format=TEMPLATE_FORMAT)
-        else:
-            raise
+    atoms = load_template(TEMPLATE_FILE, TEMPLATE_FORMAT)
 
     n_sites = len(atoms)
     print(f"Read template with {n_sites} sites from '{TEMPLATE_FILE}'.")
@@ -323,39 +1286,68 @@ def main():
     if sum(composition.values()) != n_sites:
         raise ValueError(f"Composition sum {sum(composition.values())} != number of sites {n_sites}")
 
-    # 2) Build pairs & adjacency
-    pairs = build_neighbor_pairs(atoms, CUTOFF)
-    n_pairs = len(pairs)
-    neigh = build_adjacency_list(pairs, n_sites)
-    print(f"Found {n_pairs} neighbor pairs (bonds) with cutoff {CUTOFF} Å.")
+    # 2) Build pairs & adjacency (one topology per neighbor shell)
+    shells = SHELLS or [(0.0, CUTOFF)]
+    topologies = [load_or_build_topology(atoms, r_max, TOPOLOGY_CACHE_DIR, r_min) for r_min, r_max in shells]
+    targets_list = []
+    for s, ((r_min, r_max), (shell_pairs, _)) in enumerate(zip(shells, topologies)):
+        print(f"Shell {s + 1}: found {len(shell_pairs)} neighbor pairs (bonds) with {r_min} < d <= {r_max} Å.")
+        targets_list.append(shell_pair_targets(shell_targets[s] if SHELLS else target_bonds,
+                                               composition, len(shell_pairs)))
+    if SHELLS:
+        pairs, neigh = stack_shell_topologies(topologies)
+        targets = targets_list
+    else:
+        (pairs, neigh), targets = topologies[0], targets_list[0]
 
     # Feasibility quick check: totals must match if exact matching is required
-    sum_target = sum(target_bonds.values())
-    print(f"Sum target bonds = {sum_target}, available unordered bonds = {n_pairs}")
-    if sum_target != n_pairs:
-        print("NOTE: sum(target_bonds) != total available bonds. Exact match impossible unless you change targets.")
-        # continue anyway to attempt best approximation.
-
-    # 3) Initialize random types
-    types = random_types_from_composition(n_sites, composition, rng)
+    for s, (shell_targ, (shell_pairs, _)) in enumerate(zip(targets_list, topologies)):
+        sum_target = sum(shell_targ.values())
+        print(f"Shell {s + 1}: sum target bonds = {sum_target}, available unordered bonds = {len(shell_pairs)}")
+        if sum_target != len(shell_pairs):
+            print("NOTE: sum(target bonds) != total available bonds. Exact match impossible unless you change targets.")
+            # continue anyway to attempt best approximation.
+
+    # 3) Initialize types (random shuffle or greedy warm start)
+    types = initial_types(INIT_METHOD, n_sites, composition, targets, pairs, neigh, rng)
     unique_initial = np.unique(types)
     print("Initial unique types:", unique_initial.tolist())
 
-    # 4) Simulated annealing
-    print("\nStarting simulated annealing...")
-    best_types_sa, best_cost_sa, sa_stats, best_counts_sa = simulated_annealing_swaps(
-        types.copy(), pairs, target_bonds, neigh,
-        n_steps=SA_N_STEPS, T0=SA_T0, T_final=SA_T_FINAL,
-        print_every=SA_PRINT_EVERY, rng=rng
-    )
-    print("SA stats:", sa_stats)
+    # 4) Simulated annealing (or replica exchange)
+    if PT_N_REPLICAS > 1:
+        print(f"\nStarting parallel tempering with {PT_N_REPLICAS} replicas...")
+        best_types_sa, best_cost_sa, sa_stats, _ = parallel_tempering_swaps(
+            types.copy(), pairs, targets, neigh, n_replicas=PT_N_REPLICAS,
+            T_min=PT_T_MIN, T_max=PT_T_MAX, n_steps=SA_N_STEPS,
+            exchange_every=PT_EXCHANGE_EVERY, n_workers=PT_N_WORKERS, rng=rng, weights=SHELL_WEIGHTS,
+            backend=BACKEND
+        )
+        for rep in sa_stats["replicas"]:
+            print(f"  replica T={rep['T']:.4f}: attempted={rep['attempted']}, accepted={rep['accepted']}, "
+                  f"acc_rate={rep['acc_rate']:.3f}")
+        for ex in sa_stats["exchanges"]:
+            print(f"  exchange T={ex['T_pair'][0]:.4f}<->{ex['T_pair'][1]:.4f}: "
+                  f"{ex['accepted']}/{ex['attempted']} accepted")
+    else:
+        print("\nStarting simulated annealing...")
+        best_types_sa, best_cost_sa, sa_stats, _ = simulated_annealing_swaps(
+            types.copy(), pairs, targets, neigh,
+            n_steps=SA_N_STEPS, T0=SA_T0, T_final=SA_T_FINAL,
+            print_every=SA_PRINT_EVERY, rng=rng, backend=BACKEND, adaptive=adaptive_settings(),
+            weights=SHELL_WEIGHTS
+        )
+        print("SA stats:", sa_stats)
+        if "steps_saved" in sa_stats:
+            print(f"Adaptive SA ran {sa_stats['steps_run']} of {SA_N_STEPS} steps "
+                  f"(saved {sa_stats['steps_saved']}, reheats={sa_stats['reheats']}).")
     print("SA best cost:", best_cost_sa)
 
     # 5) Greedy local search
     print("\nStarting greedy local search to reduce L1 residual...")
     improved_types, improved_counts = greedy_random_local_search(
-        best_types_sa.copy(), pairs, neigh, target_bonds, best_counts_sa,
-        max_no_improve_iters=GREEDY_MAX_NO_IMPROVE, rng=rng
+        best_types_sa.copy(), pairs, neigh, targets,
+        max_no_improve_iters=GREEDY_MAX_NO_IMPROVE, rng=rng, backend=BACKEND,
+        stop_score=GREEDY_STOP_L1 if SA_ADAPTIVE else None, weights=SHELL_WEIGHTS
     )
 
     # 6) Write output with element symbols
@@ -366,19 +1358,21 @@ def main():
     print(f"\nWrote optimized structure to '{OUTPUT_FILE}' with symbols: {sorted(set(symbols_list))}")
 
     # 7) Print final verification
-    actual_counts = improved_counts
-    print("\nFinal bond counts and residuals (actual - target):")
-    for pair, targ in sorted(target_bonds.items()):
-        act = actual_counts.get(pair, 0)
-        print(f"  {pair}: target={targ:6d}, actual={act:6d}, residual={act - targ:6d}")
-
-    # summary stats
-    print("\nSummary:")
-    print("  Total available bonds:", n_pairs)
-    print("  Sum target bonds:", sum_target)
-    print("  Unique atom types in final:", sorted(set(symbols_list)))
-    print("  L2 cost (sum squared errors):", sum((actual_counts.get(p,0)-t)**2 for p,t in target_bonds.items()))
-    print("  L1 residual:", total_l1_residual(actual_counts, target_bonds))
+    counts_list = improved_counts if SHELLS else [improved_counts]
+    for s, (actual_counts, shell_targ, (shell_pairs, _)) in enumerate(zip(counts_list, targets_list, topologies)):
+        alpha = pair_counts_to_wc_alpha(actual_counts, composition, len(shell_pairs))
+        print(f"\nShell {s + 1}: final bond counts and residuals (actual - target):")
+        for pair, targ in sorted(shell_targ.items()):
+            act = actual_counts.get(pair, 0)
+            print(f"  {pair}: target={targ:6d}, actual={act:6d}, residual={act - targ:6d}, alpha={alpha[pair]:+.4f}")
+
+        # summary stats
+        print(f"Shell {s + 1} summary:")
+        print("  Total available bonds:", len(shell_pairs))
+        print("  Sum target bonds:", sum(shell_targ.values()))
+        print("  L2 cost (sum squared errors):", sum((actual_counts.get(p,0)-t)**2 for p,t in shell_targ.items()))
+        print("  L1 residual:", total_l1_residual(actual_counts, shell_targ))
+    print("\nUnique atom types in final:", sorted(set(symbols_list)))
 
 if __name__ == "__main__":
     main()
@@ -1,34 +1,418 @@
+#!/usr/bin/env python3
+"""
+collect_aimd_structure.py
+
+Writes POSCARs of selected ionic steps of a VASP AIMD run. vasprun.xml is streamed
+with ElementTree.iterparse: only the <atominfo> block and the structure (and, on
+request, energies and forces) of the selected <calculation> steps are read, every
+element is dropped once handled, and parsing stops after the last selected step.
+Memory use therefore does not grow with the run length, and eigenvalues/DOS are
+never parsed. A truncated vasprun.xml (run still going) is read up to its last
+complete step. Runs without vasprun.xml are read from OUTCAR (positions, forces and
+energies of every ionic step) or XDATCAR (positions only) with the same line-streaming
+approach.
+
+With --root, every run directory below root (a directory holding vasprun.xml, OUTCAR or
+XDATCAR, in that order of preference) is extracted by a process pool. root/aimd_manifest.json
+records the size and mtime of each run's source file, the extraction options and the
+frames written; runs whose source and options are unchanged (and whose POSCARs still
+exist) are skipped, so re-running over a campaign only touches the runs that changed.
+All frames of all runs are listed in root/aimd_index.csv.
+
+Usage:
+    python collect_aimd_structure.py [run_dir] [--timestep 2] [--first 100] [--last 1000] [--interval 100]
+        [--energies] [--forces]
+    python collect_aimd_structure.py --root campaign_dir [--workers 8] [--force] [same options]
+Step i (0-based ionic step) is at time i * timestep fs; the steps first/timestep,
+(first + interval)/timestep, ... up to last/timestep are written to
+run_dir/Extracted_POSCARs as <n>-POSCAR_<time>-fs.vasp (--last defaults to the end of
+the run). --energies writes energies.csv, --forces a <n>-FORCES_<time>-fs.dat per step.
+XDATCAR configurations are counted as ionic steps, so with NBLOCK > 1 set --timestep to
+NBLOCK * POTIM.
+
+Requirements: numpy
+"""
+
+import argparse
+import csv
+import json
 import os
 import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-from pymatgen.io.vasp.outputs import Vasprun
-
-try:
-    path = sys.argv[1]
-except IndexError:
-    path = '.'
-
-vrun = Vasprun(os.path.join(path, 'vasprun.xml'))
-structures = vrun.structures
-print(f'Total structures are {len(structures)}')
-
-# Define the timesteps for which you want to dump the structures
-timestep_ = 2 #2fs
-first_str_time = 100 #100th fs
-last_str_time = int(input('Enter last structure time in fs (timestep should be considered here): '))
-#last_str_time = 1000 #1000th fs
-interval = 100 #100 fs
-timesteps = np.arange(int((first_str_time)/timestep_), int(((last_str_time)/timestep_)+1), int(interval/timestep_))  # Modify this list according to your desired timesteps
-#print(timesteps)
-
-output_folder = os.path.join(path, 'Extracted_POSCARs')
-os.makedirs(output_folder, exist_ok=True)
-
-for index, timestep in enumerate(timesteps, start=1):
-    if timestep < len(structures):
-        structure = structures[timestep]
-        poscar_file = os.path.join(output_folder, f'{index}-POSCAR_{timestep*timestep_}-fs.vasp')
-        structure.to(fmt="poscar", filename=poscar_file)
-        print(f"Structure at timestep {timestep} saved to {poscar_file}")
-    else:
-        print(f"No structure available for timestep {timestep}")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import write_poscar  # noqa: E402
+
+SOURCES = ("vasprun.xml", "OUTCAR", "XDATCAR")   # trajectory files, in order of preference
+OUTPUT_FOLDER = "Extracted_POSCARs"
+MANIFEST_FILE = "aimd_manifest.json"
+INDEX_FILE = "aimd_index.csv"
+ENERGY_KEYS = ("e_fr_energy", "e_wo_entrp", "e_0_energy")
+
+
+# ==========================
+# STREAMING VASPRUN READER
+# ==========================
+def _varray(elem):
+    """<varray> element -> float array."""
+    return np.array([v.text.split() for v in elem.findall("v")], dtype=np.float64)
+
+def _atom_symbols(atominfo):
+    """Element symbol of every atom from <atominfo>."""
+    for array in atominfo.findall("array"):
+        if array.get("name") == "atoms":
+            return [rc.find("c").text.strip() for rc in array.find("set").findall("rc")]
+    raise ValueError("vasprun.xml: <atominfo> has no atoms array")
+
+def _step_filter(steps):
+    """(wanted, last_wanted) for a range, an iterable of step indices or None (all steps)."""
+    if steps is None or isinstance(steps, range):
+        return steps, None if steps is None else (steps[-1] if len(steps) else -1)
+    wanted = set(int(s) for s in steps)
+    return wanted, max(wanted, default=-1)
+
+def iter_vasprun_frames(filename, steps=None, energies=False, forces=False):
+    """
+    Yield a dict for every selected ionic step of vasprun.xml: step (0-based index of the
+    <calculation>), symbols, lattice (3x3, Å), frac (N x 3) and, on request, energy
+    (dict of the <energy> items, eV) and forces (N x 3, eV/Å). steps: a range or iterable
+    of step indices, or None for all steps.
+    """
+    wanted, last_wanted = _step_filter(steps)
+    symbols = None
+    step = -1
+    complete = 0    # <calculation> blocks read to their end tag
+    depth = 0
+    context = ET.iterparse(filename, events=("start", "end"))
+    _, root = next(context)
+    try:
+        for event, elem in context:
+            if event == "start":
+                depth += 1
+                if depth == 1 and elem.tag == "calculation":
+                    step += 1
+                continue
+            depth -= 1
+            if depth == 0 and elem.tag == "atominfo":
+                symbols = _atom_symbols(elem)
+            elif depth == 0 and elem.tag == "calculation":
+                complete += 1
+                if wanted is None or step in wanted:
+                    structure = elem.find("structure")
+                    frame = {"step": step, "symbols": symbols,
+                             "lattice": _varray(structure.find("crystal").find("varray[@name='basis']")),
+                             "frac": _varray(structure.find("varray[@name='positions']"))}
+                    if energies:
+                        frame["energy"] = {i.get("name"): float(i.text) for i in elem.find("energy").findall("i")}
+                    if forces:
+                        frame["forces"] = _varray(elem.find("varray[@name='forces']"))
+                    yield frame
+                if last_wanted is not None and step >= last_wanted:
+                    return
+            if depth == 0:
+                # drop every finished top-level element (and everything below it)
+                root.clear()
+    except ET.ParseError as err:
+        print(f"{filename}: stopped after {complete} complete ionic steps ({err}); "
+              f"the file is probably still being written")
+
+def iter_outcar_frames(filename, steps=None, energies=False, forces=False):
+    """
+    Same frames as iter_vasprun_frames from an OUTCAR: the lattice of the last
+    "direct lattice vectors" block, the cartesian POSITION/TOTAL-FORCE table of each
+    ionic step and its final free energy / energy without entropy / sigma->0 line.
+    """
+    wanted, last_wanted = _step_filter(steps)
+    elements, counts, lattice = [], None, None
+    step = -1
+    complete = 0    # ionic steps read up to their final energy line
+    frame = None
+    try:
+        with open(filename, errors="replace") as f:
+            for line in f:
+                if frame is not None:
+                    if "free  energy   TOTEN" in line:
+                        frame["energy"]["e_fr_energy"] = float(line.split("=")[1].split()[0])
+                    elif "energy  without entropy=" in line:
+                        parts = line.split("=")
+                        frame["energy"]["e_wo_entrp"] = float(parts[1].split()[0])
+                        frame["energy"]["e_0_energy"] = float(parts[2].split()[0])
+                        complete += 1
+                        if wanted is None or step in wanted:
+                            if not energies:
+                                del frame["energy"]
+                            yield frame
+                        frame = None
+                        if last_wanted is not None and step >= last_wanted:
+                            return
+                elif "VRHFIN =" in line:
+                    elements.append(line.split("=")[1].split(":")[0].strip())
+                elif "ions per type =" in line:
+                    counts = [int(n) for n in line.split("=")[1].split()]
+                elif "direct lattice vectors" in line:
+                    lattice = np.array([next(f).split()[:3] for _ in range(3)], dtype=np.float64)
+                elif "POSITION" in line and "TOTAL-FORCE" in line:
+                    step += 1
+                    next(f)
+                    n_atoms = sum(counts)
+                    if wanted is not None and step not in wanted:
+                        for _ in range(n_atoms):
+                            next(f)
+                        frame = {"step": step, "energy": {}}
+                        continue
+                    rows = [next(f) for _ in range(n_atoms)]
+                    if not rows[-1].endswith("\n"):
+                        raise ValueError("incomplete POSITION table")
+                    table = np.array([row.split()[:6] for row in rows], dtype=np.float64)
+                    frame = {"step": step, "symbols": [e for e, n in zip(elements, counts) for _ in range(n)],
+                             "lattice": lattice, "frac": np.linalg.solve(lattice.T, table[:, :3].T).T, "energy": {}}
+                    if forces:
+                        frame["forces"] = table[:, 3:]
+    except (ValueError, IndexError, StopIteration) as err:
+        print(f"{filename}: stopped after {complete} complete ionic steps ({err!r}); "
+              f"the file is probably still being written")
+        return
+    if frame is not None:
+        print(f"{filename}: stopped after {complete} complete ionic steps; the file is probably still being written")
+
+def iter_xdatcar_frames(filename, steps=None):
+    """
+    Same frames as iter_vasprun_frames (positions only) from an XDATCAR; the header is
+    re-read whenever it is repeated (variable-cell runs). Each configuration is a step.
+    """
+    wanted, last_wanted = _step_filter(steps)
+    step = -1
+    complete = 0    # configurations read to their last line
+    try:
+        with open(filename) as f:
+            while True:
+                line = f.readline()
+                if not line.strip():
+                    if not line:
+                        return
+                    continue
+                if not line.lstrip().startswith("Direct configuration"):
+                    scale = float(f.readline().split()[0])
+                    lattice = np.array([f.readline().split()[:3] for _ in range(3)], dtype=np.float64)
+                    if scale < 0:
+                        scale = (-scale / abs(np.linalg.det(lattice))) ** (1.0 / 3.0)
+                    lattice *= scale
+                    elements = f.readline().split()
+                    counts = [int(n) for n in f.readline().split()]
+                    symbols = [e for e, n in zip(elements, counts) for _ in range(n)]
+                    continue
+                step += 1
+                block = [f.readline() for _ in range(len(symbols))]
+                if not block[-1].endswith("\n"):
+                    print(f"{filename}: stopped after {complete} complete configurations; "
+                          f"the file is probably still being written")
+                    return
+                complete += 1
+                if wanted is None or step in wanted:
+                    yield {"step": step, "symbols": symbols, "lattice": lattice,
+                           "frac": np.array([b.split()[:3] for b in block], dtype=np.float64)}
+                if last_wanted is not None and step >= last_wanted:
+                    return
+    except (ValueError, IndexError) as err:
+        print(f"{filename}: stopped after {complete} complete configurations ({err!r}); "
+              f"the file is probably still being written")
+
+def iter_frames(filename, steps=None, energies=False, forces=False):
+    """Dispatch to the vasprun.xml, OUTCAR or XDATCAR reader by file name."""
+    name = os.path.basename(filename)
+    if name.startswith("OUTCAR"):
+        return iter_outcar_frames(filename, steps, energies, forces)
+    if name.startswith("XDATCAR"):
+        if energies or forces:
+            print(f"{filename}: XDATCAR has no energies or forces; writing positions only")
+        return iter_xdatcar_frames(filename, steps)
+    return iter_vasprun_frames(filename, steps, energies, forces)
+
+def selected_steps(timestep, first, last=None, interval=None):
+    """Ionic step indices first/timestep, (first + interval)/timestep, ... up to last/timestep (None = open-ended)."""
+    start = int(first / timestep)
+    stride = max(1, int(interval / timestep)) if interval else 1
+    if last is None:
+        return range(start, sys.maxsize, stride)
+    return range(start, int(last / timestep) + 1, stride)
+
+def species_counts(symbols):
+    """(elements, counts) of consecutive runs of symbols, as in a POSCAR."""
+    elements, counts = [], []
+    for s in symbols:
+        if elements and elements[-1] == s:
+            counts[-1] += 1
+        else:
+            elements.append(s)
+            counts.append(1)
+    return elements, counts
+
+
+# ==========================
+# EXTRACTION
+# ==========================
+def extract_run(path, timestep=2, first=100, last=None, interval=100, output_folder=None,
+                energies=False, forces=False, source="vasprun.xml", verbose=True):
+    """
+    Write the selected steps of path/<source> as POSCARs. Returns one record per written
+    frame: index, step, time_fs, poscar (file path) and, with energies, the energy terms.
+    """
+    steps = selected_steps(timestep, first, last, interval)
+    output_folder = output_folder or os.path.join(path, OUTPUT_FOLDER)
+    os.makedirs(output_folder, exist_ok=True)
+
+    records = []
+    for frame in iter_frames(os.path.join(path, source), steps, energies, forces):
+        index = steps.index(frame["step"]) + 1
+        time_fs = frame["step"] * timestep
+        elements, counts = species_counts(frame["symbols"])
+        poscar_file = os.path.join(output_folder, f'{index}-POSCAR_{time_fs:g}-fs.vasp')
+        write_poscar(poscar_file, frame["lattice"], elements, counts, frame["frac"],
+                     comment=f"{''.join(f'{e}{n}' for e, n in zip(elements, counts))} step {frame['step']} t={time_fs:g}fs")
+        record = {"index": index, "step": frame["step"], "time_fs": time_fs, "poscar": poscar_file}
+        if "forces" in frame:
+            np.savetxt(os.path.join(output_folder, f'{index}-FORCES_{time_fs:g}-fs.dat'), frame["forces"], fmt="%.8f")
+        if "energy" in frame:
+            record.update((k, frame["energy"].get(k)) for k in ENERGY_KEYS)
+        records.append(record)
+        if verbose:
+            print(f"Structure at timestep {frame['step']} saved to {poscar_file}")
+
+    if energies and any("e_fr_energy" in r for r in records):
+        with open(os.path.join(output_folder, "energies.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index", "step", "time_fs"] + list(ENERGY_KEYS))
+            writer.writerows([r["index"], r["step"], r["time_fs"]] + [r.get(k) for k in ENERGY_KEYS] for r in records)
+    if last is not None and verbose:
+        for step in steps[len(records):]:
+            print(f"No structure available for timestep {step}")
+    return records
+
+
+# ==========================
+# MULTI-RUN EXTRACTION
+# ==========================
+def discover_runs(root, sources=SOURCES):
+    """Sorted (run_dir, source_name) of every directory below root holding one of `sources`."""
+    runs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != OUTPUT_FOLDER)
+        for source in sources:
+            if source in filenames:
+                runs.append((dirpath, source))
+                break
+    return runs
+
+def source_stamp(path):
+    """Size and modification time of a trajectory file, as stored in the manifest."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def load_manifest(root):
+    """Manifest of a previous --root extraction ({} if there is none or it is unreadable)."""
+    try:
+        with open(os.path.join(root, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def is_current(entry, source, stamp, options, root):
+    """True if a manifest entry was made from the same source file with the same options and its POSCARs exist."""
+    return (entry is not None and entry.get("source") == source and entry.get("stamp") == stamp
+            and entry.get("options") == options
+            and all(os.path.exists(os.path.join(root, r["poscar"])) for r in entry.get("frames", [])))
+
+def _extract_job(root, run_dir, source, options, output_folder):
+    """Process-pool task: extract one run, POSCAR paths made relative to root."""
+    records = extract_run(run_dir, options["timestep"], options["first"], options["last"], options["interval"],
+                          output_folder, options["energies"], options["forces"], source, verbose=False)
+    for r in records:
+        r["poscar"] = os.path.relpath(r["poscar"], root)
+    return records
+
+def extract_tree(root, timestep=2, first=100, last=None, interval=100, output_folder=None,
+                 energies=False, forces=False, n_workers=None, force=False):
+    """
+    Extract every run below root in a process pool, skipping runs recorded as current in
+    root/aimd_manifest.json (unless force), and write root/aimd_index.csv.
+    Returns the manifest.
+    """
+    options = {"timestep": timestep, "first": first, "last": last, "interval": interval,
+               "energies": energies, "forces": forces}
+    old = load_manifest(root)
+    manifest, jobs = {}, {}
+    for run_dir, source in discover_runs(root):
+        run = os.path.relpath(run_dir, root)
+        stamp = source_stamp(os.path.join(run_dir, source))
+        if not force and is_current(old.get(run), source, stamp, options, root):
+            manifest[run] = old[run]
+        else:
+            jobs[run] = (run_dir, source, stamp)
+    print(f"{len(manifest) + len(jobs)} runs found: {len(jobs)} to extract, {len(manifest)} up to date")
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(_extract_job, root, run_dir, source, options,
+                                   os.path.join(output_folder, run) if output_folder else None): (run, source, stamp)
+                       for run, (run_dir, source, stamp) in jobs.items()}
+            for done, future in enumerate(as_completed(futures), start=1):
+                run, source, stamp = futures[future]
+                try:
+                    frames = future.result()
+                except Exception as err:  # one broken run must not stop the campaign
+                    print(f"[{done}/{len(jobs)}] {run}: failed ({err})")
+                    continue
+                manifest[run] = {"source": source, "stamp": stamp, "options": options, "frames": frames}
+                print(f"[{done}/{len(jobs)}] {run} ({source}): {len(frames)} structures")
+        save_manifest(root, manifest)
+    elif manifest != old:
+        save_manifest(root, manifest)
+
+    with open(os.path.join(root, INDEX_FILE), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["run", "source", "index", "step", "time_fs", "poscar"] + list(ENERGY_KEYS))
+        for run in sorted(manifest):
+            entry = manifest[run]
+            writer.writerows([run, entry["source"], r["index"], r["step"], r["time_fs"], r["poscar"]]
+                             + [r.get(k, "") for k in ENERGY_KEYS] for r in entry["frames"])
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write POSCARs of selected AIMD steps from vasprun.xml")
+    parser.add_argument("path", nargs="?", default=".", help="Run directory containing vasprun.xml")
+    parser.add_argument("--root", help="Extract every run (vasprun.xml/OUTCAR/XDATCAR) below this directory")
+    parser.add_argument("--workers", type=int, help="Processes for --root (default: all CPUs)")
+    parser.add_argument("--force", action="store_true", help="With --root, re-extract runs the manifest marks as current")
+    parser.add_argument("--timestep", type=float, default=2, help="MD time step in fs (POTIM)")
+    parser.add_argument("--first", type=float, default=100, help="Time of the first structure in fs")
+    parser.add_argument("--last", type=float, help="Time of the last structure in fs (default: end of run)")
+    parser.add_argument("--interval", type=float, default=100, help="Time between structures in fs")
+    parser.add_argument("--output-folder", help="Default: <path>/Extracted_POSCARs (with --root: <output-folder>/<run>)")
+    parser.add_argument("--energies", action="store_true", help="Also write energies.csv")
+    parser.add_argument("--forces", action="store_true", help="Also write the forces of every step")
+    args = parser.parse_args(argv)
+
+    if args.root:
+        manifest = extract_tree(args.root, args.timestep, args.first, args.last, args.interval, args.output_folder,
+                                args.energies, args.forces, args.workers, args.force)
+        print(f"Indexed {sum(len(e['frames']) for e in manifest.values())} structures of {len(manifest)} runs "
+              f"in {os.path.join(args.root, INDEX_FILE)}")
+        return
+    source = next((s for s in SOURCES if os.path.exists(os.path.join(args.path, s))), SOURCES[0])
+    written = extract_run(args.path, args.timestep, args.first, args.last, args.interval, args.output_folder,
+                          args.energies, args.forces, source)
+    print(f'Wrote {len(written)} structures')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+check_interstitial_sites.py
+
+Sanity check of vacancy_tools.interstitial_sites() on perfect and thermally rattled
+BCC and FCC supercells: every cell must give exactly the tetrahedral (coordination 4)
+and octahedral (coordination 6) site counts of the perfect lattice, per unit cell
+12 + 6 in BCC and 8 + 4 in FCC. Rattling splits the degenerate octahedra into
+several nearby circumcenters and spreads the first-shell distances, which is what
+relaxed and MD input structures look like.
+
+Usage:
+    python check_interstitial_sites.py
+
+Requirements: numpy, scipy
+"""
+
+import time
+import numpy as np
+
+from vacancy_tools import interstitial_sites
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+LATTICES = {"bcc": (2.88, [[0, 0, 0], [0.5, 0.5, 0.5]], 12, 6),
+            "fcc": (3.60, [[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5], [0, 0.5, 0.5]], 8, 4)}
+REPEATS = 4                  # n x n x n conventional cells
+NOISE = [0.0, 0.02, 0.035, 0.05]  # Gaussian displacement per Cartesian component (Å)
+N_SEEDS = 3
+
+
+def rattled_cell(a, basis, n, sigma, rng):
+    """(frac, lattice) of an n x n x n cubic supercell with Gaussian displacements of sigma Å."""
+    g = np.array(np.meshgrid(*[np.arange(n)] * 3, indexing="ij"), dtype=np.float64).reshape(3, -1).T
+    frac = np.vstack([(g + b) / n for b in basis])
+    lattice = np.eye(3) * a * n
+    return frac + rng.normal(scale=sigma, size=frac.shape) @ np.linalg.inv(lattice), lattice
+
+
+def main():
+    failures = 0
+    print(f"{'lattice':>7} {'noise':>6} {'seed':>4} {'tet':>6} {'oct':>6} {'other':>6} {'time':>7}")
+    for name, (a, basis, n_tet, n_oct) in LATTICES.items():
+        expected = (n_tet * REPEATS ** 3, n_oct * REPEATS ** 3, 0)
+        for sigma in NOISE:
+            for seed in range(N_SEEDS if sigma else 1):
+                frac, lattice = rattled_cell(a, basis, REPEATS, sigma, np.random.default_rng(seed))
+                t0 = time.perf_counter()
+                sites = interstitial_sites(frac, lattice)
+                elapsed = time.perf_counter() - t0
+                cn = np.bincount(sites["coordination"], minlength=7)
+                found = (int(cn[4]), int(cn[6]), len(sites["frac"]) - int(cn[4] + cn[6]))
+                failures += found != expected
+                print(f"{name:>7} {sigma:6.3f} {seed:4d} {found[0]:6d} {found[1]:6d} {found[2]:6d} {elapsed:6.2f}s"
+                      + ("" if found == expected else f"  expected {expected[:2]}"))
+    print("All site counts match." if not failures else f"{failures} cells gave wrong site counts.")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,90 +7,64 @@
 
 
 import os
-from itertools import accumulate
+import sys
 import numpy as np
 
-def read_poscar(file_path):
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-
-    # Extracting data from POSCAR
-    lattice_constant = float(lines[1])
-    lattice_vectors = [list(map(float, line.split())) for line in lines[2:5]]
-    elements = lines[5].split()
-    element_counts = list(map(int, lines[6].split()))
-    total_atoms = sum(element_counts)
-    atom_coords = [list(map(float, line.split()[:3])) for line in lines[8:8+total_atoms]]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import read_poscar as _read_poscar, write_poscar as _write_poscar, scaled_lattice  # noqa: E402
+from vacancy_tools import remove_atoms, nearest_neighbors, configuration_fingerprint, register_configuration, write_multiplicity_table  # noqa: E402
 
-    return lattice_constant, lattice_vectors, elements, element_counts, atom_coords
+def read_poscar(file_path):
+    p = _read_poscar(file_path)
+    return p["scale"], p["lattice"], p["elements"], p["counts"], p["positions"]
 
 def write_poscar(file_path, lattice_constant, lattice_vectors, elements, element_counts, atom_coords, deleted_atom_coords):
-    with open(file_path, 'w') as f:
-        # Writing header with deleted atom coordinates
-        f.write(f"Generated by Python | Deleted Atom Coordinates: {' '.join(map(str, deleted_atom_coords))}\n")
-        f.write(f"{lattice_constant:.10f}\n")
-        for vector in lattice_vectors:
-            f.write(f"{vector[0]:.10f} {vector[1]:.10f} {vector[2]:.10f}\n")
-        f.write(' '.join(elements) + '\n')
-        f.write(' '.join(map(str, element_counts)) + '\n')
-        f.write("Direct\n")
-
-        # Writing atom coordinates
-        for coord in atom_coords:
-            f.write(f"{coord[0]:.10f} {coord[1]:.10f} {coord[2]:.10f}\n")
-
-def find_nearest_neighbors(atom_index, atom_coords, lattice_vectors, lattice_constant):
-    atom_coord = np.array(atom_coords[atom_index])
-    distances = []
-
-    for coord in atom_coords:
-        delta = np.array(coord) - atom_coord
-        delta -= np.round(delta)  # Apply periodic boundary conditions
-
-        # Calculate distance using lattice vectors
-        distance = np.linalg.norm(np.dot(delta, lattice_vectors))
-        distances.append(distance)
-
-    sorted_indices = np.argsort(distances)
-    neighbor_indices = []
-
-    for index in sorted_indices:
-        if index != atom_index:
-            neighbor_indices.append(index)
-            if len(neighbor_indices) == 1:  # Get only the first nearest neighbor
-                break
-
-    return neighbor_indices
-
-def delete_atom(poscar_file_path, output_dir):
+    # Writing header with deleted atom coordinates
+    comment = f"Generated by Python | Deleted Atom Coordinates: {' '.join(map(str, deleted_atom_coords))}"
+    _write_poscar(file_path, lattice_vectors, elements, element_counts, atom_coords,
+                  comment=comment, scale=lattice_constant)
+
+def delete_atom(poscar_file_path, output_dir, symmetry_unique=False):
     # Read original POSCAR file
     lattice_constant, lattice_vectors, elements, element_counts, atom_coords = read_poscar(poscar_file_path)
 
-    start_indices = list(accumulate(element_counts))  # Starting indices of each element
+    # symmetry_unique: write one POSCAR per class of equivalent configurations (same species
+    # and sorted distances in the shells around the vacancies), listed in multiplicity.csv
+    species = np.repeat(elements, element_counts)
+    # lattice in Å for the fingerprints (a negative scale line is the cell volume)
+    cell = scaled_lattice({"scale": lattice_constant, "lattice": np.asarray(lattice_vectors)})
+    classes = {}
+
     total_atoms = sum(element_counts)
+    # first nearest neighbor(s) of every atom, minimum image, in one pass
+    neighbor_table = nearest_neighbors(atom_coords, lattice_vectors, n_neighbors=1)
     
     for i in range(total_atoms):
-        element_index = next(j for j, start_index in enumerate(start_indices) if i < start_index)  # Find element index for the atom at index i
-
         # Create new atom coordinates by excluding the atom at index i and its first nearest neighbor
-        neighbor_indices = find_nearest_neighbors(i, atom_coords, lattice_vectors, lattice_constant)
+        neighbor_indices = neighbor_table[i].tolist()
         delete_indices = [i] + neighbor_indices[:1]  # Keep only the first nearest neighbor
-        new_atom_coords = [coord for j, coord in enumerate(atom_coords) if j not in delete_indices]
+        # mask-based removal; every deleted atom is subtracted from its own species
+        new_atom_coords, new_element_counts, _ = remove_atoms(atom_coords, element_counts, delete_indices)
 
         # Get the coordinates of the deleted atoms
-        deleted_atom_coords = [atom_coords[j] for j in delete_indices]
-
-        # Adjust the element counts
-        new_element_counts = element_counts[:]
-        new_element_counts[element_index] -= len(delete_indices)
+        deleted_atom_coords = [atom_coords[j].tolist() for j in delete_indices]
 
         # Create a new POSCAR file name
         file_name = f"POSCAR_{i}_{neighbor_indices[0]}.vasp"
         output_path = os.path.join(output_dir, file_name)
 
+        if symmetry_unique:
+            fingerprint = configuration_fingerprint(atom_coords, cell, species, delete_indices)
+            if not register_configuration(classes, fingerprint, file_name):
+                continue
+
         # Write new POSCAR file
         write_poscar(output_path, lattice_constant, lattice_vectors, elements, new_element_counts, new_atom_coords, deleted_atom_coords)
 
+    if symmetry_unique:
+        write_multiplicity_table(os.path.join(output_dir, "multiplicity.csv"), classes)
+        print(f"{total_atoms} configurations -> {len(classes)} symmetry-unique POSCARs")
+
 
 # Example usage
 delete_atom('POSCAR', 'output_directory')
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+making_k_vac_cluster_POSCARs.py
+
+Reads a POSCAR and writes one POSCAR for every connected cluster of K vacancies,
+i.e. every set of K atoms that is connected through the chosen neighbor shells
+(K = 2 with SHELLS = [1] gives all first-nearest-neighbor di-vacancies, K = 3 all
+connected tri-vacancies: chains and triangles). Clusters are streamed from the
+neighbor graph one at a time and written by a pool of worker processes, so large
+cells never hold the full cluster list in memory.
+
+Usage: edit USER INPUTS below and run:
+    python making_k_vac_cluster_POSCARs.py
+
+Requirements: numpy, scipy
+"""
+
+import os
+import sys
+import time
+from itertools import islice
+from multiprocessing import Pool
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import read_poscar, write_poscar, scaled_lattice, direct_positions  # noqa: E402
+from vacancy_tools import (remove_atoms, shell_windows, neighbor_graph, connected_clusters,  # noqa: E402
+                           configuration_fingerprint, register_configuration, write_multiplicity_table)
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+POSCAR_FILE = "POSCAR"
+OUTPUT_DIR = "output_directory"
+K_VACANCIES = 3               # atoms removed per cluster (1..5 is practical)
+SHELLS = [1]                  # neighbor shells that connect a cluster: shell numbers (1 = nearest)
+                              # and/or explicit (r_min, r_max) windows in Å, e.g. [1, 2] or [(0.0, 2.6)]
+SYMMETRY_UNIQUE = False       # write one POSCAR per equivalent class + multiplicity.csv
+N_WORKERS = None              # writer processes; None = all cores
+BATCH_SIZE = 2000             # clusters handed to the pool at a time
+MAX_CLUSTERS = None           # stop after this many clusters (None = all)
+
+# ==========================
+# WRITER (pool workers)
+# ==========================
+_STRUCTURE = {}
+
+def _init_worker(structure):
+    """Pool initializer: keep the parsed POSCAR in the worker."""
+    _STRUCTURE.update(structure)
+
+def _write_cluster(cluster):
+    """Write the POSCAR with the atoms in `cluster` removed; return its file name."""
+    p = _STRUCTURE
+    positions, counts, keep = remove_atoms(p["positions"], p["counts"], cluster)
+    file_name = "POSCAR_" + "_".join(str(i) for i in cluster) + ".vasp"
+    write_poscar(os.path.join(p["output_dir"], file_name), p["lattice"], p["elements"], counts,
+                 positions, comment=f"Generated by Python | Vacancies: {' '.join(map(str, cluster))}",
+                 scale=p["scale"], cartesian=p["cartesian"], flags=p["flags"][keep] if p["flags"] is not None else None)
+    return file_name
+
+# ==========================
+# MAIN
+# ==========================
+def main():
+    poscar = read_poscar(POSCAR_FILE)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    lattice = scaled_lattice(poscar)
+    frac = direct_positions(poscar)
+    species = np.repeat(poscar["elements"] or [f"type{k + 1}" for k in range(len(poscar["counts"]))], poscar["counts"])
+
+    windows = shell_windows(frac, lattice, SHELLS)
+    adjacency = neighbor_graph(frac, lattice, windows)
+    degrees = [len(nb) for nb in adjacency]
+    print(f"Read {len(frac)} atoms; shells {SHELLS} -> windows {[(round(a, 3), round(b, 3)) for a, b in windows]} Å, "
+          f"{min(degrees)}-{max(degrees)} neighbors per atom.")
+
+    clusters = connected_clusters(adjacency, K_VACANCIES)
+    if MAX_CLUSTERS:
+        clusters = islice(clusters, MAX_CLUSTERS)
+    classes = {}
+    if SYMMETRY_UNIQUE:
+        clusters = (c for c in clusters
+                    if register_configuration(classes, configuration_fingerprint(frac, lattice, species, c),
+                                              "POSCAR_" + "_".join(str(i) for i in c) + ".vasp"))
+
+    structure = dict(poscar, output_dir=OUTPUT_DIR)
+    t0 = time.time()
+    n_written = 0
+    with Pool(N_WORKERS or os.cpu_count() or 1, initializer=_init_worker, initargs=(structure,)) as pool:
+        # bounded batches keep the generator lazy (Pool.imap would drain it up front)
+        for batch in iter(lambda: list(islice(clusters, BATCH_SIZE)), []):
+            for _ in pool.imap_unordered(_write_cluster, batch, chunksize=64):
+                n_written += 1
+            print(f"{n_written} POSCARs written, time={time.time() - t0:.1f}s")
+
+    if SYMMETRY_UNIQUE:
+        write_multiplicity_table(os.path.join(OUTPUT_DIR, "multiplicity.csv"), classes)
+        print(f"{sum(len(m) for m in classes.values())} clusters -> {len(classes)} symmetry-unique POSCARs")
+    print(f"Wrote {n_written} {K_VACANCIES}-vacancy POSCARs to '{OUTPUT_DIR}'.")
+
+
+if __name__ == "__main__":
+    main()
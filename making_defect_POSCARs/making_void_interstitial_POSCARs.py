@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+making_void_interstitial_POSCARs.py
+
+Deterministic alternative to Placing_random_interstitial.py: finds every interstitial
+void of the host POSCAR (Voronoi vertices and octahedral-type Voronoi face centres of
+the periodic Delaunay tessellation), ranks them by free radius and writes one POSCAR
+per site and interstitial species. The void list is cached per structure, so running
+again with other species (or after adding sites) skips the tessellation.
+
+Outputs in OUTPUT_DIR:
+    sites.csv                      site, fractional position, free radius, coordination
+    POSCAR_<species>_<site>.vasp   host + one interstitial at that site
+
+Usage: edit USER INPUTS below and run:
+    python making_void_interstitial_POSCARs.py
+
+Requirements: numpy, scipy
+"""
+
+import csv
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import read_poscar, write_poscar, scaled_lattice, direct_positions  # noqa: E402
+from vacancy_tools import interstitial_sites  # noqa: E402
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+POSCAR_FILE = "POSCAR"
+OUTPUT_DIR = "interstitial_sites"
+SPECIES = ["Cr"]              # one POSCAR per site for each of these interstitial species
+MIN_RADIUS = 0.0              # drop voids with a smaller free radius (Å)
+MERGE_TOL = 0.2               # voids closer than this fraction of the nearest-neighbor distance are one site
+EDGE_SITES = True             # include Voronoi face centres (octahedral sites of BCC)
+MAX_SITES = None              # keep only the largest MAX_SITES voids (None = all)
+CACHE_DIR = ".void_cache"     # None disables the per-structure cache
+
+# ==========================
+# MAIN
+# ==========================
+def main():
+    poscar = read_poscar(POSCAR_FILE)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    lattice = scaled_lattice(poscar)
+    frac = direct_positions(poscar)
+
+    t0 = time.time()
+    sites = interstitial_sites(frac, lattice, min_radius=MIN_RADIUS, merge_tol=MERGE_TOL,
+                               edge_sites=EDGE_SITES, cache_dir=CACHE_DIR)
+    site_frac = sites["frac"][:MAX_SITES]
+    print(f"Read {len(frac)} atoms; {len(sites['frac'])} voids found in {time.time() - t0:.2f}s, "
+          f"writing {len(site_frac)}.")
+
+    with open(os.path.join(OUTPUT_DIR, "sites.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["site", "a", "b", "c", "free_radius", "coordination"])
+        for k, (pos, r, cn) in enumerate(zip(site_frac, sites["free_radius"], sites["coordination"])):
+            writer.writerow([k, *(f"{x:.8f}" for x in pos), f"{r:.4f}", cn])
+
+    elements = poscar["elements"] or [f"type{k + 1}" for k in range(len(poscar["counts"]))]
+    for species in SPECIES:
+        for k, pos in enumerate(site_frac):
+            write_poscar(os.path.join(OUTPUT_DIR, f"POSCAR_{species}_{k}.vasp"), lattice, elements + [species],
+                         poscar["counts"] + [1], np.vstack([frac, pos]),
+                         comment=f"Generated by Python | {species} interstitial at site {k}", decimals=8)
+    print(f"Wrote {len(SPECIES) * len(site_frac)} POSCARs to '{OUTPUT_DIR}'.")
+
+
+if __name__ == "__main__":
+    main()
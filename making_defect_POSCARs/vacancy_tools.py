@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+"""
+vacancy_tools.py
+
+Helpers shared by the vacancy POSCAR scripts in this folder.
+
+nearest_neighbors() returns the nearest-neighbor table of every atom in one pass:
+minimum-image distances are computed in NumPy blocks (identical ordering to the
+per-atom loop the scripts used before), or through a cKDTree over the periodic
+images for large cells.
+
+neighbor_graph() and connected_clusters() enumerate every connected k-vacancy
+cluster within chosen neighbor shells lazily, one cluster at a time.
+
+remove_atoms() deletes a set of atoms with a keep-mask and decrements the count of
+each removed atom's own species.
+
+place_interstitials() inserts many interstitials at once by rejection sampling large
+batches of random points against a KD-tree of the periodic host atoms;
+interstitial_sites() instead enumerates every void deterministically (Voronoi
+vertices and Gabriel-edge midpoints of the periodic Delaunay tessellation), merged
+within a fraction of the local nearest-neighbor distance (so the split circumcenters
+of distorted octahedra in relaxed or rattled cells become one site) and ranked by
+free radius, with an optional per-structure cache.
+
+configuration_fingerprint() hashes a vacancy configuration by the species and
+sorted distances of the removed atoms and of their neighbor shells, so symmetry- and
+chemically-equivalent configurations can be written once with a multiplicity.
+
+Requirements: numpy, scipy
+"""
+
+import csv
+import hashlib
+import itertools
+import os
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree, Delaunay
+
+BRUTE_FORCE_MAX_ATOMS = 5000    # "auto" switches to the KD-tree above this many atoms
+BLOCK_ELEMENTS = 2000000        # centers x atoms per distance block
+INTERSTITIAL_BATCH = 4096       # random candidate points proposed per batch
+SHELL_SEARCH = 12               # nearest atoms searched for the first shell of a void
+
+
+# ==========================
+# NEAREST NEIGHBORS
+# ==========================
+def minimum_image_distances(frac_coords, lattice_vectors, centers):
+    """
+    (len(centers), N) minimum-image distances from atoms `centers` to all atoms.
+    Uses the same operations as the old per-atom loop (delta -= round(delta), then
+    norm(delta @ lattice)), so ties sort exactly as before.
+    """
+    frac_coords = np.asarray(frac_coords, dtype=np.float64)
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    delta = frac_coords[None, :, :] - frac_coords[centers][:, None, :]
+    delta -= np.round(delta)  # Apply periodic boundary conditions
+    cart = delta.reshape(-1, 3) @ lattice_vectors
+    # row-wise dot products, bit-identical to np.linalg.norm of each row
+    dist = np.sqrt(np.matmul(cart[:, None, :], cart[:, :, None]))
+    return dist.reshape(len(centers), len(frac_coords))
+
+def periodic_tree(cart, lattice_vectors):
+    """
+    cKDTree over the 27 periodic images of the Cartesian points `cart`; tree index
+    m is image m // len(cart) of point m % len(cart).
+    """
+    shifts = np.array(list(itertools.product((-1, 0, 1), repeat=3)), dtype=np.float64) @ lattice_vectors
+    return cKDTree((cart[None, :, :] + shifts[:, None, :]).reshape(-1, 3))
+
+def _brute_force_neighbors(frac_coords, lattice_vectors, n_neighbors):
+    """Neighbor table from full distance rows, sorted with np.argsort like the old loop."""
+    n_atoms = len(frac_coords)
+    table = np.empty((n_atoms, n_neighbors), dtype=np.int64)
+    block = max(1, BLOCK_ELEMENTS // max(n_atoms, 1))
+    for start in range(0, n_atoms, block):
+        centers = np.arange(start, min(start + block, n_atoms))
+        order = np.argsort(minimum_image_distances(frac_coords, lattice_vectors, centers), axis=1)
+        for row, i in zip(order, centers):
+            first = row[:n_neighbors + 1]
+            table[i] = first[first != i][:n_neighbors]
+    return table
+
+def _kdtree_neighbors(frac_coords, lattice_vectors, n_neighbors):
+    """
+    Neighbor table from a cKDTree over the 27 periodic images (any cell shape).
+    Equidistant neighbors (within 1e-8 Å) are ordered by atom index.
+    """
+    frac_coords = np.asarray(frac_coords, dtype=np.float64)
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    n_atoms = len(frac_coords)
+    cart = (frac_coords - np.floor(frac_coords)) @ lattice_vectors
+    tree = periodic_tree(cart, lattice_vectors)
+    # extra candidates so that a whole shell of equidistant neighbors is seen
+    k = min(tree.n, 2 * n_neighbors + 16)
+    dist, idx = tree.query(cart, k=k)
+    idx = idx % n_atoms
+    table = np.empty((n_atoms, n_neighbors), dtype=np.int64)
+    for i in range(n_atoms):
+        keep = idx[i] != i
+        d, j = dist[i][keep], idx[i][keep]
+        order = np.lexsort((j, np.round(d, 8)))
+        _, first = np.unique(j[order], return_index=True)
+        table[i] = j[order][np.sort(first)][:n_neighbors]
+    return table
+
+def nearest_neighbors(frac_coords, lattice_vectors, n_neighbors=1, method="auto"):
+    """
+    (N, n_neighbors) array: the n_neighbors closest atoms (minimum image) of every atom.
+    method: "brute" (vectorized distance rows, same choice among ties as the old loop),
+    "kdtree" (large cells) or "auto" (brute up to BRUTE_FORCE_MAX_ATOMS atoms).
+    """
+    n_atoms = len(frac_coords)
+    if method == "auto":
+        method = "brute" if n_atoms <= BRUTE_FORCE_MAX_ATOMS else "kdtree"
+    if method == "brute":
+        return _brute_force_neighbors(frac_coords, lattice_vectors, n_neighbors)
+    if method == "kdtree":
+        return _kdtree_neighbors(frac_coords, lattice_vectors, n_neighbors)
+    raise ValueError(f"Unknown neighbor search method '{method}' (use 'auto', 'brute' or 'kdtree')")
+
+
+# ==========================
+# REMOVING ATOMS
+# ==========================
+def remove_atoms(atom_coords, element_counts, delete_indices):
+    """
+    Remove atoms `delete_indices` (indices into the species-ordered POSCAR list) in linear
+    time. Returns (new_coords, new_counts, keep): each removed atom is subtracted from the
+    count of its own species; keep is the boolean mask of the remaining atoms (use it
+    for per-atom data such as selective-dynamics flags).
+    """
+    atom_coords = np.asarray(atom_coords)
+    delete_indices = np.unique(np.asarray(delete_indices, dtype=np.int64))
+    keep = np.ones(len(atom_coords), dtype=bool)
+    keep[delete_indices] = False
+    species = np.searchsorted(np.cumsum(element_counts), delete_indices, side="right")
+    new_counts = (np.asarray(element_counts) - np.bincount(species, minlength=len(element_counts))).tolist()
+    return atom_coords[keep], new_counts, keep
+
+
+# ==========================
+# INTERSTITIALS
+# ==========================
+def place_interstitials(frac_coords, lattice_vectors, n_sites, min_distance=1.0, min_separation=None,
+                        rng=None, batch_size=INTERSTITIAL_BATCH, max_batches=1000):
+    """
+    (n_sites, 3) fractional positions of random interstitials at least min_distance (Å)
+    from every host atom and min_separation (Å, default min_distance) from each other,
+    periodic images included. Candidates are drawn uniformly in batches, filtered against
+    a KD-tree of the host images and accepted in draw order (random sequential addition).
+    """
+    frac_coords = np.asarray(frac_coords, dtype=np.float64).reshape(-1, 3)
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    min_separation = min_distance if min_separation is None else min_separation
+    if max(min_distance, min_separation) > 2 * inscribed_radius(lattice_vectors):
+        raise ValueError(f"Exclusion radius {max(min_distance, min_separation)} Å exceeds the smallest "
+                         f"cell height {2 * inscribed_radius(lattice_vectors):.3f} Å")
+    rng = np.random.default_rng(rng)
+    host = periodic_tree((frac_coords - np.floor(frac_coords)) @ lattice_vectors, lattice_vectors)
+
+    placed = np.empty((0, 3))
+    for _ in range(max_batches):
+        frac = rng.random((batch_size, 3))
+        cart = frac @ lattice_vectors
+        dist, _ = host.query(cart, k=1, distance_upper_bound=min_distance)
+        free = np.isinf(dist)
+        if len(placed) and min_separation > 0:
+            dist, _ = periodic_tree(placed @ lattice_vectors, lattice_vectors).query(
+                cart, k=1, distance_upper_bound=min_separation)
+            free &= np.isinf(dist)
+        frac, cart = frac[free], cart[free]
+        if len(frac) == 0:
+            continue
+        if min_separation > 0:
+            # conflicts among this batch's survivors, then greedy acceptance in draw order
+            pairs = periodic_tree(cart, lattice_vectors).query_ball_point(cart, min_separation)
+            accepted = []
+            blocked = np.zeros(len(frac), dtype=bool)
+            for i, near in enumerate(pairs):
+                if blocked[i]:
+                    continue
+                accepted.append(i)
+                blocked[np.asarray(near, dtype=np.int64) % len(frac)] = True
+                if len(placed) + len(accepted) == n_sites:
+                    break
+            frac = frac[accepted]
+        placed = np.vstack([placed, frac[:n_sites - len(placed)]])
+        if len(placed) == n_sites:
+            return placed
+    raise RuntimeError(f"Placed only {len(placed)} of {n_sites} interstitials after {max_batches} batches "
+                       f"of {batch_size} candidates; lower min_distance/min_separation")
+
+
+def _circumcenters(points, simplices):
+    """Circumcenters of tetrahedra (M, 4) or midpoints/circumcenters of edges (M, 2); NaN if degenerate."""
+    p0 = points[simplices[:, 0]]
+    if simplices.shape[1] == 2:
+        return 0.5 * (p0 + points[simplices[:, 1]])
+    edges = points[simplices[:, 1:]] - p0[:, None, :]
+    rhs = 0.5 * np.einsum("mij,mij->mi", edges, edges)
+    center = np.full(p0.shape, np.nan)
+    ok = np.abs(np.linalg.det(edges)) > 1e-10
+    center[ok] = p0[ok] + np.linalg.solve(edges[ok], rhs[ok][:, :, None])[:, :, 0]
+    return center
+
+def interstitial_sites(frac_coords, lattice_vectors, min_radius=0.0, merge_tol=0.2, edge_sites=True,
+                       cache_dir=None):
+    """
+    Every interstitial void of the periodic structure, largest first. Returns a dict with
+    frac (M, 3), free_radius (M,) = distance (Å) to the nearest host atom, and
+    coordination (M,) = size of the first shell, i.e. the host atoms before the largest
+    jump in the sorted site-atom distances (4 tetrahedral, 6 octahedral).
+
+    Candidates are the circumcenters of the periodic Delaunay tetrahedra (Voronoi
+    vertices, e.g. tetrahedral sites) and, with edge_sites, the midpoints of Delaunay
+    edges that no other atom is closer to (e.g. the octahedral sites of BCC, which lie
+    on Voronoi faces). Candidates closer than merge_tol x the local nearest-neighbor
+    distance (periodic) are merged into the one with the largest free radius, so a
+    distorted octahedron split into several tetrahedra gives one site. Sites with a
+    first shell of fewer than four atoms (bond centres) or below min_radius are
+    dropped. With cache_dir the result is stored as cache_dir/voids_<key>.npz and
+    reused for the same structure.
+    """
+    frac_coords = np.asarray(frac_coords, dtype=np.float64).reshape(-1, 3)
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    path = None
+    if cache_dir:
+        h = hashlib.sha256()
+        for arr in (frac_coords, lattice_vectors):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(repr((float(min_radius), float(merge_tol), bool(edge_sites))).encode())
+        path = os.path.join(cache_dir, f"voids_{h.hexdigest()[:20]}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return {key: data[key] for key in data.files}
+
+    n_atoms = len(frac_coords)
+    home = frac_coords - np.floor(frac_coords)
+    host = periodic_tree(home @ lattice_vectors, lattice_vectors)
+
+    # periodic padding: images within a few mean atomic spacings of the home cell
+    heights = np.abs(np.linalg.det(lattice_vectors)) / np.linalg.norm(
+        np.cross(lattice_vectors[[1, 2, 0]], lattice_vectors[[2, 0, 1]]), axis=1)
+    margin = 3.0 * (np.abs(np.linalg.det(lattice_vectors)) / n_atoms) ** (1.0 / 3.0)
+    pad = np.minimum(margin / heights, 1.0)
+    shifts = np.array(list(itertools.product((-1, 0, 1), repeat=3)), dtype=np.float64)
+    padded = (home[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    padded = padded[np.all((padded >= -pad) & (padded < 1.0 + pad), axis=1)]
+    points = padded @ lattice_vectors
+    tri = Delaunay(points)
+
+    candidates = [_circumcenters(points, tri.simplices)]
+    if edge_sites:
+        edges = np.sort(tri.simplices[:, list(itertools.combinations(range(4), 2))].reshape(-1, 2), axis=1)
+        candidates.append(_circumcenters(points, np.unique(edges, axis=0)))
+    cart = np.vstack(candidates)
+    cart = cart[np.all(np.isfinite(cart), axis=1)]
+    frac = np.linalg.solve(lattice_vectors.T, cart.T).T
+    # half-open window shifted by a hair so sites on the cell faces are kept exactly once
+    inside = np.all((frac >= -1e-8) & (frac < 1.0 - 1e-8), axis=1)
+    frac, cart = np.maximum(frac[inside], 0.0), cart[inside]
+
+    free_radius, nearest = host.query(cart, k=1)
+    keep = free_radius >= max(min_radius, 1e-6)
+    if edge_sites:
+        # an edge midpoint is a site only if its two end atoms are (among) the nearest ones
+        n_vertex = np.count_nonzero(inside[:len(candidates[0])])
+        radius, _ = host.query(cart, k=2)
+        keep &= (np.arange(len(cart)) < n_vertex) | (radius[:, 1] - radius[:, 0] < 1e-6)
+    frac, cart, free_radius = frac[keep], cart[keep], free_radius[keep]
+
+    # merge near-duplicates (periodic) into the member with the largest free radius; the
+    # tolerance follows the nearest-neighbor distance of the atom closest to each candidate
+    atom_nn = host.query(home @ lattice_vectors, k=2)[0][:, 1]
+    tol = merge_tol * atom_nn[nearest[keep] % n_atoms]
+    found = cKDTree(cart).sparse_distance_matrix(periodic_tree(cart, lattice_vectors), tol.max(initial=0.0),
+                                                 output_type="ndarray")
+    rows, cols = found["i"], found["j"] % max(len(cart), 1)
+    close = found["v"] <= 0.5 * (tol[rows] + tol[cols])
+    _, labels = connected_components(coo_matrix((np.ones(np.count_nonzero(close)), (rows[close], cols[close])),
+                                                shape=(len(cart),) * 2))
+    order = np.lexsort((-free_radius, labels))
+    _, first = np.unique(labels[order], return_index=True)
+    best = order[first]
+    best = best[np.argsort(-free_radius[best], kind="stable")]
+
+    # first shell: the atoms before the largest jump in the sorted distances
+    dist, _ = host.query(cart[best], k=min(SHELL_SEARCH, 27 * n_atoms))
+    coordination = np.argmax(np.diff(np.atleast_2d(dist), axis=1), axis=1).astype(np.int64) + 1
+    # a void is enclosed by at least four atoms (drops bond centres found as edge midpoints)
+    best, coordination = best[coordination >= 4], coordination[coordination >= 4]
+    sites = {"frac": frac[best], "free_radius": free_radius[best], "coordination": coordination}
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write under a temporary name so concurrent runs never read a partial file
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **sites)
+        os.replace(tmp, path)
+    return sites
+
+
+# ==========================
+# NEIGHBOR GRAPH AND CLUSTERS
+# ==========================
+def shell_windows(frac_coords, lattice_vectors, shells, tol=0.05, n_sample=50):
+    """
+    Distance windows (r_min, r_max] in Å for neighbor shells given by number (1 = nearest).
+    Shells are the distinct minimum-image distances (merged within tol Å) seen from the
+    first n_sample atoms; each window runs between the midpoints to the adjacent shells.
+    Entries of `shells` that are already (r_min, r_max) tuples are passed through.
+    """
+    numbers = [s for s in shells if not isinstance(s, (tuple, list))]
+    windows = {}
+    if numbers:
+        centers = np.arange(min(n_sample, len(frac_coords)))
+        dist = np.sort(minimum_image_distances(frac_coords, lattice_vectors, centers).ravel())
+        dist = dist[(dist > tol) & (dist <= inscribed_radius(lattice_vectors))]
+        breaks = np.nonzero(np.diff(dist) > tol)[0]
+        starts, ends = np.r_[0, breaks + 1], np.r_[breaks, len(dist) - 1]
+        radii = [(float(dist[a]), float(dist[b])) for a, b in zip(starts, ends)]
+        if max(numbers) > len(radii):
+            raise ValueError(f"Only {len(radii)} neighbor shells fit in this cell; asked for shell {max(numbers)}")
+        for k in numbers:
+            lo = 0.5 * (radii[k - 2][1] + radii[k - 1][0]) if k > 1 else 0.0
+            hi = 0.5 * (radii[k - 1][1] + radii[k][0]) if k < len(radii) else radii[k - 1][1] + tol
+            windows[k] = (lo, hi)
+    return [tuple(s) if isinstance(s, (tuple, list)) else windows[s] for s in shells]
+
+def neighbor_graph(frac_coords, lattice_vectors, windows):
+    """
+    Adjacency list (one sorted int array per atom) linking atoms whose periodic distance
+    lies in any of the (r_min, r_max] windows (Å), from a cKDTree over the 27 images.
+    """
+    frac_coords = np.asarray(frac_coords, dtype=np.float64)
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    n_atoms = len(frac_coords)
+    cart = (frac_coords - np.floor(frac_coords)) @ lattice_vectors
+    found = cKDTree(cart).sparse_distance_matrix(periodic_tree(cart, lattice_vectors), max(hi for _, hi in windows),
+                                                 output_type="ndarray")
+    i, j, d = found["i"], found["j"] % n_atoms, found["v"]
+    keep = i != j
+    keep &= np.any([(d > lo) & (d <= hi) for lo, hi in windows], axis=0)
+    key = np.unique(i[keep].astype(np.int64) * n_atoms + j[keep])
+    src, dst = np.divmod(key, n_atoms)
+    return np.split(dst, np.searchsorted(src, np.arange(1, n_atoms)))
+
+def connected_clusters(adjacency, k):
+    """
+    Yield every connected set of k atoms of the neighbor graph exactly once, as a sorted
+    tuple, without holding them in memory (ESU enumeration: each cluster is grown only
+    from its lowest atom and only through atoms outside the current closed neighborhood).
+    """
+    neighbors = [set(nb.tolist()) for nb in adjacency]
+
+    def extend(cluster, extension, root, closed):
+        if len(cluster) == k:
+            yield tuple(sorted(cluster))
+            return
+        extension = set(extension)
+        while extension:
+            w = extension.pop()
+            new_ext = extension | {u for u in neighbors[w] if u > root and u not in closed}
+            yield from extend(cluster + [w], new_ext, root, closed | neighbors[w])
+
+    for root in range(len(neighbors)):
+        yield from extend([root], {u for u in neighbors[root] if u > root}, root, neighbors[root] | {root})
+
+
+# ==========================
+# SYMMETRY-EQUIVALENT CONFIGURATIONS
+# ==========================
+def inscribed_radius(lattice_vectors):
+    """Half the smallest perpendicular cell height: the largest unambiguous minimum-image radius."""
+    lattice_vectors = np.asarray(lattice_vectors, dtype=np.float64)
+    volume = abs(np.linalg.det(lattice_vectors))
+    a, b, c = lattice_vectors
+    return 0.5 * volume / max(np.linalg.norm(np.cross(b, c)), np.linalg.norm(np.cross(c, a)),
+                              np.linalg.norm(np.cross(a, b)))
+
+def configuration_fingerprint(frac_coords, lattice_vectors, species, removed, radius=None, decimals=2):
+    """
+    Hash of a vacancy configuration (atoms `removed`) that is the same for configurations
+    related by a lattice symmetry with the same local chemistry: the species and sorted
+    mutual distances of the removed atoms, plus species and sorted distances-to-the-vacancies
+    of every atom within `radius` Å of a vacancy. The default radius, 1.5 x the nearest-neighbor
+    distance (two shells in BCC/FCC, capped at inscribed_radius), groups configurations by
+    local environment; pass inscribed_radius(lattice) to compare the whole cell. Distances
+    are compared after rounding to `decimals`; lattice_vectors must be in Å.
+    """
+    removed = list(removed)
+    species = np.asarray(species)
+    dist = minimum_image_distances(frac_coords, lattice_vectors, removed)
+    if radius is None:
+        others = np.delete(dist[0], removed[0])
+        radius = min(1.5 * others.min(), inscribed_radius(lattice_vectors) * (1 - 1e-6))
+    rounded = np.round(dist, decimals)
+    core = sorted((str(species[r]), tuple(sorted(np.delete(rounded[a, removed], a).tolist())))
+                  for a, r in enumerate(removed))
+    near = dist.min(axis=0) <= radius
+    near[removed] = False
+    env = sorted(zip(species[near].tolist(), map(tuple, np.sort(rounded[:, near], axis=0).T.tolist())))
+    return hashlib.sha1(repr((core, env)).encode()).hexdigest()[:16]
+
+def register_configuration(classes, fingerprint, label):
+    """Add label to its class in `classes` (fingerprint -> labels); True if it is the first one."""
+    members = classes.setdefault(fingerprint, [])
+    members.append(label)
+    return len(members) == 1
+
+def write_multiplicity_table(path, classes):
+    """CSV with one row per class: representative, multiplicity, fingerprint and all members."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class", "representative", "multiplicity", "fingerprint", "members"])
+        for k, (fingerprint, members) in enumerate(classes.items(), start=1):
+            writer.writerow([k, members[0], len(members), fingerprint, " ".join(members)])
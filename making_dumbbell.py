@@ -1,123 +1,133 @@
-#This code is used to create 100, 110 and 111 dumbell around a atom which is input by a user. It takes "CONTCAR_pe" as input file with cartesian coordinates. USer can predefine the type of 
-#interstitial needed in line 56 and 57. List of atom to be deleted or around which dumbell needs to be added is defined in line 83 and type is defined in 84. Please keep in mind tha atom ids
-#added in this code is one less than what is defined by Ovito.
+#This code is used to create 100, 110 and 111 (and user-defined) dumbbells around atoms chosen by the user. It takes "CONTCAR_pe" as input file (Cartesian or Direct).
+#The interstitial types, orientations and dumbbell length are set in USER INPUTS below. Atoms to be replaced by a dumbbell are given either as a list of atom ids or as a
+#selection rule (all atoms of some species). Please keep in mind that atom ids added in this code are one less than what is defined by Ovito.
+#The structure is read once; dumbbells are generated lazily and written by a thread pool in batches of JOB_CHUNK structures.
 
 import numpy as np
+import itertools
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from poscar_io import read_poscar, write_poscar, scaled_lattice, cartesian_positions, atom_symbols
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "making_defect_POSCARs"))
+from vacancy_tools import periodic_tree  # noqa: E402
+
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+CONTCAR_FILE = "CONTCAR_pe"
+ATOM_IDS = [61,60,19,117,116,55,97,56,112,31,11,46,105,67,65]  # atom ids (Ovito numbering) replaced by a dumbbell
+SELECT_SPECIES = None          # or e.g. ["Mn"]: every atom of these species (used when ATOM_IDS is None)
+DUMBBELL_TYPES = ("Cr", "Cr")  # element symbols of the two dumbbell atoms
+ORIENTATIONS = ["100", "110", "111"]  # Miller strings ("100", "1-10", "112") or 3-vectors
+OFFSET_SCALE = 0.30            # half dumbbell length / local first-neighbor distance (0.75 Å in bcc Cr)
+OFFSET = None                  # fixed half dumbbell length in Å (overrides OFFSET_SCALE)
+N_THREADS = 8                  # file-writing threads
+JOB_CHUNK = 64                 # structures generated and written per batch (bounds memory)
 
 def read_contcar(filename="CONTCAR"):
-    """Reads the CONTCAR file and extracts atomic positions."""
-    with open(filename, "r") as file:
-        lines = file.readlines()
-
-    scale = float(lines[1].strip())
-    lattice_vectors = np.array([list(map(float, line.split())) for line in lines[2:5]]) * scale
-    atom_types = lines[5].split()
-    atom_counts = list(map(int, lines[6].split()))
-    total_atoms = sum(atom_counts)
-    coordinate_type = lines[7].strip().lower()
-
-    if "cart" not in coordinate_type:
-        raise ValueError("Only Cartesian coordinates are supported in CONTCAR.")
-
-    start_index = 8
-    positions = np.array([list(map(float, lines[start_index + i].split()[:3])) for i in range(total_atoms)])
-
-    return lattice_vectors, atom_types, atom_counts, positions
+    """Reads the CONTCAR file and extracts atomic positions (Cartesian, Å)."""
+    poscar = read_poscar(filename)
+    return scaled_lattice(poscar), poscar["elements"], poscar["counts"], cartesian_positions(poscar)
 
 def write_contcar(lattice_vectors, atom_types, atom_counts, positions, filename="UPDATED_CONTCAR"):
     """Writes a CONTCAR file."""
-    with open(filename, "w") as file:
-        file.write("CONTCAR updated\n")
-        file.write("1.0\n")
-        for vec in lattice_vectors:
-            file.write(f"{vec[0]:.6f} {vec[1]:.6f} {vec[2]:.6f}\n")
-        file.write(" ".join(atom_types) + "\n")
-        file.write(" ".join(map(str, atom_counts)) + "\n")
-        file.write("Cartesian\n")
-        for pos in positions:
-            file.write(f"{pos[0]:.6f} {pos[1]:.6f} {pos[2]:.6f}\n")
-
-def generate_dumbbell_positions(deleted_atom_position):
-    """Generates dumbbell positions."""
+    write_poscar(filename, lattice_vectors, atom_types, atom_counts, positions,
+                 comment="CONTCAR updated", cartesian=True, decimals=6)
+
+def orientation_vector(orientation):
+    """Unit vector of a Miller string ("110", "1-10") or a 3-vector."""
+    if isinstance(orientation, str):
+        digits = iter(orientation.replace(" ", ""))
+        orientation = [-int(next(digits)) if c == "-" else int(c) for c in digits]
+    v = np.asarray(orientation, dtype=np.float64)
+    return v / np.linalg.norm(v)
+
+def orientation_name(orientation):
+    """Directory-safe name of an orientation: the Miller string itself, or the vector components joined by "_"."""
+    return orientation if isinstance(orientation, str) else "_".join(f"{x:g}" for x in orientation)
+
+def select_sites(symbols, atom_ids=None, species=None):
+    """0-based indices of the chosen host atoms: atom ids (Ovito numbering) or all atoms of `species`."""
+    if atom_ids is not None:
+        valid = [i for i in atom_ids if 1 <= i <= len(symbols)]
+        for i in set(atom_ids) - set(valid):
+            print(f"Invalid atom ID {i}. Skipping.")
+        return np.array(valid, dtype=np.int64) - 1
+    return np.flatnonzero(np.isin(symbols, species))
+
+def local_nn_distance(lattice_vectors, positions, sites, n_shell=8, tol=0.15):
+    """Mean distance to the first-neighbor shell of every site (periodic images included)."""
+    frac = np.linalg.solve(lattice_vectors.T, positions.T).T
+    cart = (frac - np.floor(frac)) @ lattice_vectors
+    tree = periodic_tree(cart, lattice_vectors)
+    dist, _ = tree.query(cart[sites], k=min(n_shell + 1, tree.n))
+    dist = dist[:, 1:]
+    in_shell = dist <= (1.0 + tol) * dist[:, :1]
+    return (dist * in_shell).sum(axis=1) / in_shell.sum(axis=1)
+
+def generate_dumbbell_positions(lattice_vectors, deleted_atom_position, half_length, orientations=ORIENTATIONS):
+    """Generates dumbbell positions (both atoms wrapped back into the cell) for every orientation."""
     base_pos = np.array(deleted_atom_position)
 
-    dumbbells = {
-        "100": [base_pos + [-0.75, 0, 0], base_pos + [0.75, 0, 0]],
-        "110": [base_pos + [-0.75 / np.sqrt(2), -0.75 / np.sqrt(2), 0],
-                base_pos + [0.75 / np.sqrt(2), 0.75 / np.sqrt(2), 0]],
-        "111": [base_pos + [-0.75 / np.sqrt(3), -0.75 / np.sqrt(3), -0.75 / np.sqrt(3)],
-                base_pos + [0.75 / np.sqrt(3), 0.75 / np.sqrt(3), 0.75 / np.sqrt(3)]]
-    }
+    dumbbells = {}
+    for orientation in orientations:
+        offset = half_length * orientation_vector(orientation)
+        pair = np.array([base_pos - offset, base_pos + offset])
+        frac = np.linalg.solve(lattice_vectors.T, pair.T).T
+        dumbbells[orientation_name(orientation)] = (frac - np.floor(frac)) @ lattice_vectors
 
     return dumbbells
 
-def write_dumbbell_contcars(lattice_vectors, atom_types, atom_counts, new_positions, deleted_atom, dir_counter, deleted_atom_index):
-    """Writes dumbbell CONTCARs with user types in numbered directories."""
-    dumbbell_positions = generate_dumbbell_positions(deleted_atom)
-
-    #dumbbell_type1 = input("Enter the element symbol for the first dumbbell atom: ")
-    #dumbbell_type2 = input("Enter the element symbol for the second dumbbell atom: ")
-    dumbbell_type1 = 'Cr'
-    dumbbell_type2 = 'Cr'
-        
-    dir_name = f"{dir_counter}-atom-id{deleted_atom_index}"
-    os.makedirs(dir_name, exist_ok=True)
-
-    for direction, positions in dumbbell_positions.items():
-        new_positions_with_dumbbell = np.concatenate([new_positions, positions])
-
-        atom_types_with_dumbbell = atom_types[:]
-        atom_counts_with_dumbbell = atom_counts[:]
-
-        atom_counts_with_dumbbell.extend([1, 1])
-        atom_types_with_dumbbell.extend([dumbbell_type1, dumbbell_type2])
-
-        filename = f"UPDATED_CONTCAR_dumbbell_{direction}"
-        filepath = os.path.join(dir_name, filename)
-        write_contcar(lattice_vectors, atom_types_with_dumbbell, atom_counts_with_dumbbell, new_positions_with_dumbbell, filepath)
-        print(f"{filename} written to {dir_name} successfully.")
-
-
-def main():
-    contcar_file = "CONTCAR_pe"
-
-    atom_ids_to_delete = [61,60,19,117,116,55,97,56,112,31,11,46,105,67,65]  # Example list of atom IDs
-    atom_types_to_delete = ["Mn", "Mn", "Cr", "V", "V", "Mn", "V", "Mn", "V", "Cr", "Cr", "Mn", "V", "Mn", "Mn"] # Example list of atom types
-
-    dir_counter = 1
-
-    for i, atom_id in enumerate(atom_ids_to_delete):
-        atom_type_to_delete = atom_types_to_delete[i]
-        lattice_vectors, atom_types, atom_counts, positions = read_contcar(contcar_file)
-
-        if atom_id < 1 or atom_id > len(positions):
-            print(f"Invalid atom ID {atom_id}. Skipping.")
-            continue
-
-        deleted_atom_index = atom_id - 1
-        deleted_atom = positions[deleted_atom_index]
-
-        new_positions = np.delete(positions, deleted_atom_index, axis=0)
-
-        try:
-            atom_type_index = atom_types.index(atom_type_to_delete)
-            atom_counts[atom_type_index] -= 1
-        except ValueError:
-            print(f"Atom type {atom_type_to_delete} not found. Skipping.")
-            continue
-
-        print(f"Deleted atom coordinates: {deleted_atom}")
-
+def dumbbell_jobs(lattice_vectors, atom_types, atom_counts, positions, sites, half_lengths,
+                  orientations=ORIENTATIONS, dumbbell_types=DUMBBELL_TYPES):
+    """Yield (filepath, types, counts, positions) for every site: the structure with the atom removed, then each dumbbell."""
+    species = np.searchsorted(np.cumsum(atom_counts), sites, side="right")
+    for dir_counter, (deleted_atom_index, species_index, half_length) in enumerate(zip(sites, species, half_lengths), start=1):
         dir_name = f"{dir_counter}-atom-id{deleted_atom_index}"
-        os.makedirs(dir_name, exist_ok=True)
-
-        write_contcar(lattice_vectors, atom_types, atom_counts, new_positions, os.path.join(dir_name, "UPDATED_CONTCAR_removed"))
-        print(f"UPDATED_CONTCAR_removed written to {dir_name} successfully.")
+        new_positions = np.delete(positions, deleted_atom_index, axis=0)
+        atom_counts_removed = list(atom_counts)
+        atom_counts_removed[species_index] -= 1
+        yield os.path.join(dir_name, "UPDATED_CONTCAR_removed"), atom_types, atom_counts_removed, new_positions
+
+        dumbbell_positions = generate_dumbbell_positions(lattice_vectors, positions[deleted_atom_index], half_length, orientations)
+        for direction, pair in dumbbell_positions.items():
+            yield (os.path.join(dir_name, f"UPDATED_CONTCAR_dumbbell_{direction}"), list(atom_types) + list(dumbbell_types),
+                   atom_counts_removed + [1, 1], np.concatenate([new_positions, pair]))
+
+def make_dumbbells(contcar_file, atom_ids=None, species=None, orientations=ORIENTATIONS, dumbbell_types=DUMBBELL_TYPES,
+                   offset_scale=OFFSET_SCALE, offset=OFFSET, n_threads=N_THREADS, job_chunk=JOB_CHUNK):
+    """Read the structure once and write the vacancy + dumbbell CONTCARs of all selected sites."""
+    lattice_vectors, atom_types, atom_counts, positions = read_contcar(contcar_file)
+    symbols = atom_symbols({"elements": atom_types, "counts": atom_counts})
+    sites = select_sites(symbols, atom_ids, species)
+    if offset is not None:
+        half_lengths = np.full(len(sites), float(offset))
+    else:
+        half_lengths = offset_scale * local_nn_distance(lattice_vectors, positions, sites)
+
+    for deleted_atom_index, half_length in zip(sites, half_lengths):
+        print(f"Atom {deleted_atom_index} ({symbols[deleted_atom_index]}) at {positions[deleted_atom_index]}: "
+              f"dumbbell half length {half_length:.3f} Å")
+
+    def write_job(job):
+        filepath, types, counts, new_positions = job
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        write_contcar(lattice_vectors, types, counts, new_positions, filepath)
+        return filepath
+
+    jobs = dumbbell_jobs(lattice_vectors, atom_types, atom_counts, positions, sites, half_lengths, orientations, dumbbell_types)
+    n_written = 0
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        # pool.map submits everything at once, so feed it one bounded batch at a time
+        for chunk in iter(lambda: list(itertools.islice(jobs, job_chunk)), []):
+            n_written += sum(1 for _ in pool.map(write_job, chunk))
+    print(f"Wrote {n_written} CONTCARs for {len(sites)} sites.")
 
-        write_dumbbell_contcars(lattice_vectors, atom_types, atom_counts, new_positions, deleted_atom, dir_counter, deleted_atom_index)
 
-        dir_counter += 1
+def main():
+    make_dumbbells(CONTCAR_FILE, ATOM_IDS, SELECT_SPECIES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+poscar_io.py
+
+Lightweight POSCAR/CONTCAR reader and writer shared by the structure scripts
+(defect, dumbbell and randomizing scripts). Coordinate blocks are parsed in bulk
+with np.loadtxt and written as one fixed-point text buffer, so a 100k-atom file
+is read or written in tens of milliseconds.
+
+Supports the scale factor (negative = target volume), VASP 4 files without the
+element line, "Selective dynamics" and Direct/Cartesian coordinates.
+
+Usage:
+    from poscar_io import read_poscar, write_poscar
+    p = read_poscar("POSCAR")
+    write_poscar("POSCAR_new", p["lattice"], p["elements"], p["counts"], p["positions"],
+                 scale=p["scale"], cartesian=p["cartesian"], flags=p["flags"])
+
+Requirements: numpy
+"""
+
+import numpy as np
+
+
+# ==========================
+# READING
+# ==========================
+def read_poscar(filename):
+    """
+    Read a POSCAR/CONTCAR into a dict with keys comment, scale, lattice (3x3 as in the
+    file, scale not applied), elements (None for VASP 4 files), counts, selective,
+    cartesian, positions (N x 3 as in the file) and flags (N x 3 bool, or None).
+    """
+    with open(filename, "r") as f:
+        lines = f.read().splitlines()
+
+    comment = lines[0].strip()
+    scale = float(lines[1].split()[0])
+    lattice = np.array([[float(x) for x in line.split()[:3]] for line in lines[2:5]])
+
+    # VASP 5 has an element-symbol line before the counts, VASP 4 does not
+    tokens = lines[5].split()
+    if all(t.isdigit() for t in tokens):
+        elements, line_no = None, 5
+    else:
+        elements, line_no = tokens, 6
+    counts = [int(x) for x in lines[line_no].split()]
+    line_no += 1
+
+    selective = lines[line_no].strip()[:1].lower() == "s"
+    if selective:
+        line_no += 1
+    cartesian = lines[line_no].strip()[:1].lower() in ("c", "k")
+    line_no += 1
+
+    n_atoms = sum(counts)
+    block = lines[line_no:line_no + n_atoms]
+    if len(block) < n_atoms:
+        raise ValueError(f"{filename}: expected {n_atoms} coordinate lines, found {len(block)}")
+    positions = np.loadtxt(block, usecols=(0, 1, 2), ndmin=2)
+    flags = None
+    if selective:
+        flags = np.char.upper(np.loadtxt(block, usecols=(3, 4, 5), dtype=str, ndmin=2)) != "F"
+
+    return {"comment": comment, "scale": scale, "lattice": lattice, "elements": elements,
+            "counts": counts, "selective": selective, "cartesian": cartesian,
+            "positions": positions, "flags": flags}
+
+def scale_factor(poscar):
+    """Length scale factor of the file (a negative scale in the file is the cell volume)."""
+    scale = poscar["scale"]
+    if scale < 0:
+        scale = (-scale / abs(np.linalg.det(poscar["lattice"]))) ** (1.0 / 3.0)
+    return scale
+
+def scaled_lattice(poscar):
+    """Lattice vectors in Å."""
+    return poscar["lattice"] * scale_factor(poscar)
+
+def direct_positions(poscar):
+    """Fractional coordinates of all atoms."""
+    if not poscar["cartesian"]:
+        return poscar["positions"]
+    return np.linalg.solve(poscar["lattice"].T, poscar["positions"].T).T
+
+def cartesian_positions(poscar):
+    """Cartesian coordinates of all atoms in Å."""
+    if poscar["cartesian"]:
+        return poscar["positions"] * scale_factor(poscar)
+    return poscar["positions"] @ scaled_lattice(poscar)
+
+def atom_symbols(poscar):
+    """Per-atom element symbols (type1, type2, ... for VASP 4 files)."""
+    elements = poscar["elements"] or [f"type{k + 1}" for k in range(len(poscar["counts"]))]
+    return [el for el, n in zip(elements, poscar["counts"]) for _ in range(n)]
+
+
+# ==========================
+# WRITING
+# ==========================
+def _fixed_point_block(values, decimals, suffix=None):
+    """
+    Format a 2D float array as fixed-point text, one row per line, in one NumPy pass:
+    digits are written straight into a byte buffer instead of formatting every number.
+    suffix (2D array of single characters) is appended to each row, space separated.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_cols = values.shape
+    scaled = np.round(np.abs(values) * 10.0 ** decimals)
+    if n_rows == 0 or scaled.max() >= 2.0 ** 62:
+        # huge values: fall back to per-number formatting
+        row = " ".join([f"%.{decimals}f"] * n_cols)
+        text = "\n".join([row] * n_rows) % tuple(values.ravel().tolist())
+        if suffix is not None:
+            text = "\n".join(line + " " + " ".join(s) for line, s in zip(text.split("\n"), suffix))
+        return text + "\n" if n_rows else ""
+
+    scaled = scaled.astype(np.int64)
+    int_part, frac_part = np.divmod(scaled, 10 ** decimals)
+    n_int = np.maximum(1, np.floor(np.log10(np.maximum(int_part, 1))).astype(np.int64) + 1)
+    width_int = int(n_int.max())
+    # field: two spaces (separator + room for the sign), integer digits, ".", decimals
+    field = 2 + width_int + 1 + decimals
+    row_len = n_cols * field + (2 * suffix.shape[1] if suffix is not None else 0) + 1
+    buf = np.full((n_rows, row_len), ord(" "), dtype=np.uint8)
+    cols = buf[:, :n_cols * field].reshape(n_rows, n_cols, field)
+
+    for k in range(width_int):
+        digit = (int_part // 10 ** k) % 10
+        pos = 2 + width_int - 1 - k
+        cols[:, :, pos] = np.where(k < n_int, ord("0") + digit, ord(" "))
+    cols[:, :, 2 + width_int] = ord(".")
+    for k in range(decimals):
+        cols[:, :, 3 + width_int + decimals - 1 - k] = ord("0") + (frac_part // 10 ** k) % 10
+    negative = (values < 0) & (scaled > 0)
+    sign_pos = 2 + width_int - 1 - n_int
+    r, c = np.nonzero(negative)
+    cols[r, c, sign_pos[r, c]] = ord("-")
+
+    if suffix is not None:
+        buf[:, n_cols * field + 1:-1:2] = np.char.encode(np.asarray(suffix, dtype="U1")).view(np.uint8)
+    buf[:, -1] = ord("\n")
+    return buf.tobytes().decode("ascii")
+
+def format_header(lattice, elements, counts, comment="Generated by Python", scale=1.0, cartesian=False,
+                  selective=False, decimals=10):
+    """POSCAR text up to and including the Direct/Cartesian line."""
+    header = f"{comment}\n{float(scale):.{decimals}f}\n"
+    header += _fixed_point_block(np.asarray(lattice, dtype=np.float64), decimals)
+    if elements:
+        header += " ".join(elements) + "\n"
+    header += " ".join(str(int(n)) for n in counts) + "\n"
+    if selective:
+        header += "Selective dynamics\n"
+    header += ("Cartesian" if cartesian else "Direct") + "\n"
+    return header
+
+def format_positions(positions, flags=None, decimals=10):
+    """Coordinate block text (one line per atom, with T/F flags if given)."""
+    suffix = None
+    if flags is not None:
+        suffix = np.where(np.asarray(flags, dtype=bool), "T", "F")
+    return _fixed_point_block(np.asarray(positions, dtype=np.float64).reshape(-1, 3), decimals, suffix)
+
+def write_poscar(filename, lattice, elements, counts, positions, comment="Generated by Python",
+                 scale=1.0, cartesian=False, flags=None, decimals=10):
+    """
+    Write a POSCAR. positions are written as given (Direct, or Cartesian if cartesian=True);
+    flags (N x 3 bool) adds a "Selective dynamics" block. elements may be None (VASP 4).
+    """
+    header = format_header(lattice, elements, counts, comment, scale, cartesian, flags is not None, decimals)
+    with open(filename, "w") as f:
+        f.write(header + format_positions(positions, flags, decimals))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+random_alloys.py
+
+Random-alloy POSCARs from one template lattice. The template is parsed once, every
+coordinate line is formatted once, and all M structures are drawn as one (M, N)
+array of random site permutations from a seeded numpy Generator: structure m puts
+the first counts[0] sites of row m on element 1, the next counts[1] on element 2,
+and so on (the same distribution as shuffling a list of atom types and sorting the
+coordinates by it). Each POSCAR is then one header plus the pre-formatted lines
+gathered in permuted order, written by a thread pool.
+
+With sro_cutoff set, candidates are screened on the fly: the template neighbor list
+is built once, the Warren-Cowley parameters of a whole chunk of candidates come from
+one bincount over the shared pair list, and only structures with every |alpha| within
+sro_tolerance are written (with their alphas in sro.csv) until n_structures have
+been accepted. Rejected candidates never reach the disk.
+
+Usage:
+    from random_alloys import write_random_alloys
+    write_random_alloys("POSCAR", {"Cr": 18, "Mn": 9, "V": 9}, 10000, "random_strs", seed=1)
+    write_random_alloys("POSCAR", {"Cr": 18, "Mn": 9, "V": 9}, 100, "sqs_like", sro_cutoff=2.7, sro_tolerance=0.05)
+
+Requirements: numpy (scipy for the SRO filter)
+"""
+import csv
+import itertools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import read_poscar, format_header, format_positions, direct_positions, scaled_lattice  # noqa: E402
+
+CHUNK_STRUCTURES = 1000     # permutations drawn and written per chunk
+PARALLEL_MIN = 200          # use the thread pool from this many structures on
+MAX_CANDIDATES = 10 ** 7    # SRO filter gives up after this many candidates
+SRO_CHUNK_BYTES = 2 ** 28   # memory budget of one SRO filter chunk (pair codes and temporaries)
+
+
+def composition_counts(composition, n_atoms):
+    """
+    (elements, counts) from a composition dict {element: atoms or fraction}. Fractions
+    are rounded with the largest-remainder rule so the counts add up to n_atoms.
+    """
+    elements = list(composition)
+    values = np.array([composition[el] for el in elements], dtype=np.float64)
+    if np.all(values == np.round(values)) and values.sum() > 1:
+        if values.sum() != n_atoms:
+            raise ValueError(f"Composition {composition} has {int(values.sum())} atoms, the template has {n_atoms}")
+        return elements, values.astype(np.int64).tolist()
+    exact = values / values.sum() * n_atoms
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(counts - exact, kind="stable")[:n_atoms - counts.sum()]] += 1
+    return elements, counts.tolist()
+
+def random_permutations(n_structures, n_atoms, rng):
+    """(n_structures, n_atoms) array; every row is an independent random permutation of the sites."""
+    dtype = np.int32 if n_atoms < 2 ** 31 else np.int64
+    return rng.permuted(np.tile(np.arange(n_atoms, dtype=dtype), (n_structures, 1)), axis=1)
+
+def permutation_types(perms, counts):
+    """(M, N) element index of every site for the permutations `perms` (see module docstring)."""
+    slot_types = np.repeat(np.arange(len(counts), dtype=np.int8 if len(counts) < 128 else np.int64), counts)
+    types = np.empty(perms.shape, dtype=slot_types.dtype)
+    np.put_along_axis(types, perms, np.broadcast_to(slot_types, perms.shape), axis=1)
+    return types
+
+def neighbor_pairs(poscar, cutoff):
+    """
+    (P, 2) directed neighbor bonds (i, j), 0 < d <= cutoff (Å), periodic images included
+    (every bond appears in both directions, like a Verlet list).
+    """
+    from scipy.spatial import cKDTree
+    lattice = scaled_lattice(poscar)
+    frac = direct_positions(poscar)
+    cart = (frac - np.floor(frac)) @ lattice
+    n_rep = np.ceil(cutoff * np.linalg.norm(np.linalg.inv(lattice), axis=0)).astype(int)
+    shifts = np.array(list(itertools.product(*(range(-n, n + 1) for n in n_rep))), dtype=np.float64) @ lattice
+    images = cKDTree((cart[None, :, :] + shifts[:, None, :]).reshape(-1, 3))
+    found = cKDTree(cart).sparse_distance_matrix(images, cutoff, output_type="ndarray")
+    found = found[found["v"] > 1e-8]
+    return np.stack([found["i"], found["j"] % len(cart)], axis=1).astype(np.int64)
+
+def wc_parameters(types, pairs, n_types):
+    """
+    (M, K, K) Warren-Cowley parameters alpha_ij = 1 - P(j | i) / c_j of every row of
+    `types` (M, N), from the shared directed pair list.
+    """
+    types = np.atleast_2d(types)
+    m = len(types)
+    codes = types[:, pairs[:, 0]].astype(np.int64) * n_types + types[:, pairs[:, 1]]
+    codes += (np.arange(m, dtype=np.int64) * n_types * n_types)[:, None]
+    counts = np.bincount(codes.ravel(), minlength=m * n_types * n_types).reshape(m, n_types, n_types)
+    rows = (np.arange(m, dtype=np.int64) * n_types)[:, None]
+    conc = np.bincount((types + rows).ravel(), minlength=m * n_types).reshape(m, n_types) / types.shape[1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_j_given_i = counts / counts.sum(axis=2, keepdims=True)
+        alpha = 1.0 - p_j_given_i / conc[:, None, :]
+    return np.nan_to_num(alpha)
+
+def sro_chunk_size(n_pairs, n_atoms, n_accept, budget=SRO_CHUNK_BYTES):
+    """
+    Candidates per SRO filter chunk: wc_parameters holds an int64 code per pair and
+    candidate plus about two more int64 temporaries and the int8 gathers, and the
+    permutation and type rows add 5 bytes per site. Capped by n_accept.
+    """
+    per_candidate = 26 * n_pairs + 5 * n_atoms
+    return int(max(1, min(n_accept, budget // max(per_candidate, 1))))
+
+def sro_filtered_permutations(pairs, counts, n_accept, tolerance, rng, chunk=None,
+                              max_candidates=MAX_CANDIDATES):
+    """
+    Yield (perms, alpha) chunks of random permutations whose Warren-Cowley parameters
+    all satisfy |alpha| <= tolerance, until n_accept have been yielded. chunk candidates
+    are drawn per round (default: sro_chunk_size for this pair list).
+    """
+    n_atoms = sum(counts)
+    if chunk is None:
+        chunk = sro_chunk_size(len(pairs), n_atoms, n_accept)
+    accepted = tried = 0
+    while accepted < n_accept:
+        if tried >= max_candidates:
+            raise RuntimeError(f"Only {accepted} of {n_accept} structures within |alpha| <= {tolerance} "
+                               f"after {tried} candidates; raise sro_tolerance")
+        perms = random_permutations(chunk, n_atoms, rng)
+        tried += chunk
+        alpha = wc_parameters(permutation_types(perms, counts), pairs, len(counts))
+        ok = np.all(np.abs(alpha) <= tolerance, axis=(1, 2))
+        take = np.flatnonzero(ok)[:n_accept - accepted]
+        accepted += len(take)
+        if len(take):
+            yield perms[take], alpha[take]
+    print(f"SRO filter: accepted {accepted} of {tried} candidates")
+
+def template_lines(poscar, decimals=10):
+    """(N, line_length) uint8 array of the formatted coordinate lines of the template."""
+    text = format_positions(poscar["positions"], poscar["flags"], decimals).encode("ascii")
+    lines = text.splitlines(keepends=True)
+    width = max(len(line) for line in lines)
+    if any(len(line) != width for line in lines):
+        # pad (only happens for huge coordinates): spaces before the newline are harmless
+        text = b"".join(line[:-1].ljust(width - 1) + b"\n" for line in lines)
+    return np.frombuffer(text, dtype=np.uint8).reshape(len(lines), width)
+
+def write_random_alloys(template_file, composition, n_structures, output_dir=".", prefix="POSCAR-", seed=None,
+                        n_workers=None, decimals=10, comment="Randomized POSCAR", sro_cutoff=None, sro_tolerance=0.05):
+    """
+    Write n_structures random alloys of `composition` on the template sites as
+    output_dir/<prefix><i>. With sro_cutoff (Å), only structures whose first-shell
+    Warren-Cowley parameters all satisfy |alpha| <= sro_tolerance are written, and their
+    alphas go to output_dir/sro.csv. Returns the list of file paths.
+    """
+    poscar = read_poscar(template_file)
+    n_atoms = sum(poscar["counts"])
+    elements, counts = composition_counts(composition, n_atoms)
+    header = format_header(poscar["lattice"], elements, counts, comment, poscar["scale"], poscar["cartesian"],
+                           poscar["flags"] is not None, decimals).encode("ascii")
+    lines = template_lines(poscar, decimals)
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, f"{prefix}{i}") for i in range(n_structures)]
+
+    if sro_cutoff:
+        chunks = sro_filtered_permutations(neighbor_pairs(poscar, sro_cutoff), counts, n_structures, sro_tolerance, rng)
+    else:
+        chunks = ((random_permutations(min(CHUNK_STRUCTURES, n_structures - start), n_atoms, rng), None)
+                  for start in range(0, n_structures, CHUNK_STRUCTURES))
+
+    def write_one(args):
+        path, perm = args
+        with open(path, "wb") as f:
+            f.write(header + lines[perm].tobytes())
+
+    sro_rows = []
+    workers = (n_workers or min(32, (os.cpu_count() or 1) + 4)) if n_structures >= PARALLEL_MIN else 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = 0
+        for perms, alpha in chunks:
+            list(pool.map(write_one, zip(paths[start:start + len(perms)], perms)))
+            if alpha is not None:
+                iu = np.triu_indices(len(counts))
+                sro_rows += [[os.path.basename(p)] + [f"{x:.5f}" for x in a[iu]]
+                             for p, a in zip(paths[start:start + len(perms)], alpha)]
+            start += len(perms)
+
+    if sro_cutoff:
+        with open(os.path.join(output_dir, "sro.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["file"] + [f"alpha_{elements[i]}-{elements[j]}" for i, j in zip(*np.triu_indices(len(counts)))])
+            writer.writerows(sro_rows)
+    return paths
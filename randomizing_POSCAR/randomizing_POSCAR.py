@@ -10,42 +10,21 @@ Created on Fri Dec  2 11:02:27 2022
 This code takes any POSCAR and randomize it based on the user input (filename and number_of_elements). User has to input exact number of atoms
 of different types as an input. 
 """
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poscar_io import read_poscar, write_poscar  # noqa: E402
+
 def randomizing_POSCAR(filename, number_of_elements):
     import numpy as np
     import random
     #Reading POSCAR file
-    file = open(str(filename), 'r')
-    
-    #readin each line of the POSCAR file
-    system_info = file.readline()
-    _ = file.readline()
-    #reading and storing box dimensions
-    x_dims = file.readline().strip().split()
-    y_dims = file.readline().strip().split()
-    z_dims = file.readline().strip().split()
-    types = file.readline().strip().split()
-    types_of_atoms = len(types)
-    num_of_atoms = file.readline().strip().split()
-    
-    #Extracting number of atoms of each type and also the total number of atoms
-    num_of_atoms_for_each_element = []
-    for i in range (0,len(num_of_atoms)):
-        _ = int(num_of_atoms[i])
-        num_of_atoms_for_each_element.append(_)
+    poscar = read_poscar(str(filename))
+    types = poscar["elements"] or []
+    num_of_atoms_for_each_element = poscar["counts"]
     total_num_of_atoms = sum(num_of_atoms_for_each_element)
     
-    coordinates_type = file.readline()
-    
-    #reading and storing coordinates of the atoms
-    x_coordinates, y_coordinates, z_coordinates = [], [], []
-    for i in range (0,total_num_of_atoms):
-        _ = file.readline().strip().split()
-        x_coordinates.append(float(_[0]))
-        y_coordinates.append(float(_[1]))
-        z_coordinates.append(float(_[2]))
-        
-    file.close()
-    
     #Make a list of random numbers based on the composition
     if number_of_elements == 2:
         comp1 = int(input('Enter the number of atoms of type 1: '))
@@ -113,35 +92,14 @@ def randomizing_POSCAR(filename, number_of_elements):
             print('Total number of atoms do not match with the number of atoms in the POSCAR')
     
     #Randomzing the coordinates
-    coordinates_with_randomized_atom_type = (np.vstack((array, x_coordinates, y_coordinates, z_coordinates))).transpose()
-    _ = coordinates_with_randomized_atom_type
-    sorted_atoms = _[_[:, 0].argsort(kind='mergesort')] #Sorting based on first column
-    
+    order = np.argsort(array, kind='mergesort') #Sorting based on the random atom types
+    sorted_positions = poscar["positions"][order]
     
     #writing the randomized POSCAR
-    file = open('randomized-' + str(filename), 'w')
-    file.writelines('Randomized POSCAR \n')
-    file.writelines('1 \n')
-    #Writing box dimensions read earlier
-    file.writelines(str(float(x_dims[0])) + ' ' + str(float(x_dims[1])) 
-                 + ' ' + str(float(x_dims[2])) + '\n')
-    file.writelines(str(float(y_dims[0])) + ' ' + str(float(y_dims[1])) 
-                 + ' ' + str(float(y_dims[2])) + '\n')
-    file.writelines(str(float(z_dims[0])) + ' ' + str(float(z_dims[1])) 
-                 + ' ' + str(float(z_dims[2])) + '\n')
-    
-    #writing the types of atoms with spaces
-    for i in range (0,number_of_elements):
-        file.writelines('type' + str(i+1) + ' ')
-
-    #writing the exact number of elements
-    file.writelines('\n' + atom_type)
-        
-    file.writelines('\n' + str(coordinates_type))
-    
-    #writing the sorted coordinates
-    for i in range (0,total_num_of_atoms):
-        file.writelines(str(sorted_atoms[i,1]) + ' ' + str(sorted_atoms[i,2]) + ' ' + str(sorted_atoms[i,3]) + '\n')
+    write_poscar('randomized-' + str(filename), poscar["lattice"],
+                 ['type' + str(i+1) for i in range (0,number_of_elements)],
+                 [int(n) for n in atom_type.split()], sorted_positions,
+                 comment='Randomized POSCAR', scale=poscar["scale"], cartesian=poscar["cartesian"])
     
     return(types)
 
@@ -2,31 +2,289 @@
 # coding: utf-8
 
 # ## This script can be used to calculate SRO for a given cell with given cutoff radius (rc)
+# ## Batch mode: Warren-Cowley parameters of every frame of many dump files (or of a multi-frame trajectory) for any
+# ## number of species, written to one CSV (or Parquet) table. The neighbor list is built once per worker and reused
+# ## for every frame with the same positions and box (MC swap runs such as mdmc-*.dump never move atoms), so only the
+# ## type-pair tallies are recomputed. Files are analyzed in parallel; plots are optional.
+# ## Two backends: mdapy (Taichi), or a built-in NumPy one (KD-tree CSR neighbor arrays + np.bincount over type pairs,
+# ## several neighbor shells at once) that skips the Taichi start-up and JIT warm-up; "auto" uses NumPy for small
+# ## cells, for more than one shell, or when mdapy is not installed (see benchmark_wc_backends.py).
 
-def calc_WC_parameter(filename, ele1, ele2, ele3, cutoff):
+import bisect
+import csv
+import glob
+import itertools
+import mmap
+import os
+import re
+from contextlib import nullcontext
+from multiprocessing import Pool
+import numpy as np
 
+# ==========================
+# USER INPUTS (edit these)
+# ==========================
+DUMP_FILES = "mdmc-*.dump"          # glob pattern or list of (single- or multi-frame) LAMMPS dump files
+ELEMENTS = ["Cr", "Mn", "V"]        # element of LAMMPS type 1, 2, ... (any number of species)
+CUTOFF = 2.8                        # neighbor cutoff (Å)
+SHELLS = None                       # None = one shell (0, CUTOFF]; or (r_min, r_max] windows in Å, e.g. [(0, 2.6), (2.6, 3.1)]
+BACKEND = "auto"                    # "numpy", "mdapy" or "auto"
+NUMPY_MAX_ATOMS = 20000             # "auto" uses the NumPy backend up to this many atoms
+OUTPUT_FILE = "wc_parameters.csv"   # .csv or .parquet (needs pandas + pyarrow)
+N_WORKERS = None                    # processes; None = all cores, 1 = serial
+PLOT = False                        # plot every alpha_ij against the frame number (wc_parameters.png)
+JOB_BYTES = 64 * 2 ** 20            # long trajectories are split into jobs of about this many bytes of frames
+
+# ==========================
+# DUMP READING
+# ==========================
+def natural_key(path):
+    """Sort key that orders mdmc-500.dump before mdmc-5000.dump."""
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", path)]
+
+def frame_ranges(filename, target_bytes=JOB_BYTES):
+    """
+    Split a dump file into byte ranges (start, end, first_frame) of whole frames, about
+    target_bytes each, so the frames of one long trajectory can be analyzed in parallel.
+    """
+    if os.path.getsize(filename) == 0:
+        return []
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        starts = [m.start() for m in re.finditer(rb"ITEM: TIMESTEP", mm)]
+        size = len(mm)
+    ranges = []
+    k = 0
+    while k < len(starts):
+        end_k = bisect.bisect_left(starts, starts[k] + target_bytes, lo=k + 1)
+        ranges.append((starts[k], starts[end_k] if end_k < len(starts) else size, k))
+        k = end_k
+    return ranges
+
+def read_dump_frames(filename, start=0, end=None):
+    """
+    Yield the frames of a LAMMPS text dump (or of its byte range start:end) as dicts with
+    timestep, box ((4, 3): three box vectors and the origin, as used by mdapy), boundary,
+    pos (N, 3) and type (N,), sorted by atom id.
+    """
+    with open(filename, "rb") as f:
+        f.seek(start)
+        lines = f.read(None if end is None else end - start).decode().splitlines()
+    n = 0
+    while n < len(lines):
+        if not lines[n].startswith("ITEM: TIMESTEP"):
+            n += 1
+            continue
+        timestep = int(lines[n + 1].split()[0])
+        n_atoms = int(lines[n + 3].split()[0])
+        bounds_header = lines[n + 4].split()
+        bounds = np.array([[float(x) for x in lines[n + 5 + k].split()] for k in range(3)])
+        boundary = [1 if b.startswith("p") else 0 for b in bounds_header[-3:]]
+        xy, xz, yz = bounds[:, 2] if bounds.shape[1] == 3 else (0.0, 0.0, 0.0)
+        # LAMMPS stores the bounding box of a triclinic cell; remove the tilt extents
+        xlo = bounds[0, 0] - min(0.0, xy, xz, xy + xz)
+        xhi = bounds[0, 1] - max(0.0, xy, xz, xy + xz)
+        ylo = bounds[1, 0] - min(0.0, yz)
+        yhi = bounds[1, 1] - max(0.0, yz)
+        box = np.array([[xhi - xlo, 0.0, 0.0], [xy, yhi - ylo, 0.0], [xz, yz, bounds[2, 1] - bounds[2, 0]],
+                        [xlo, ylo, bounds[2, 0]]])
+
+        columns = lines[n + 8].split()[2:]
+        data = np.loadtxt(lines[n + 9:n + 9 + n_atoms], ndmin=2)
+        col = {name: k for k, name in enumerate(columns)}
+        if "x" in col or "xu" in col:
+            pos = data[:, [col.get(a, col.get(a + "u")) for a in "xyz"]]
+        else:
+            scaled = data[:, [col.get(a + "s", col.get(a + "su")) for a in "xyz"]]
+            pos = scaled @ box[:3] + box[3]
+        order = np.argsort(data[:, col["id"]], kind="stable") if "id" in col else np.arange(n_atoms)
+        yield {"timestep": timestep, "box": box, "boundary": boundary,
+               "pos": np.ascontiguousarray(pos[order]), "type": data[order, col["type"]].astype(np.int64)}
+        n += 9 + n_atoms
+
+# ==========================
+# WARREN-COWLEY PARAMETERS
+# ==========================
+_NEIGHBORS = {}
+
+def _mdapy():
+    """Import mdapy and start Taichi once per process."""
     import mdapy as mp
-    import numpy as np
-    mp.init()
+    if not _NEIGHBORS.get("taichi_started"):
+        mp.init()
+        _NEIGHBORS["taichi_started"] = True
+    return mp
+
+def _have_mdapy():
+    try:
+        import mdapy  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
+def _same_structure(cached, frame, shells):
+    return (cached is not None and cached["shells"] == shells and cached["pos"].shape == frame["pos"].shape
+            and np.array_equal(cached["box"], frame["box"]) and np.array_equal(cached["pos"], frame["pos"]))
 
-    ## Reading the dump file and converting the atom types into array
-    system = mp.System(filename)
-    np.array(system.data['type'])
+def csr_neighbors(frame, shells):
+    """
+    Per shell, CSR neighbor arrays (src, indices) of the frame: atom src[k] has neighbor
+    indices[k] at a distance in that (r_min, r_max] window, periodic images included
+    (pairs in both directions; src is sorted, so it is the expanded CSR row pointer).
+    """
+    from scipy.spatial import cKDTree
+    box = frame["box"][:3]
+    periodic = np.array(frame["boundary"]) == 1
+    frac = np.linalg.solve(box.T, (frame["pos"] - frame["box"][3]).T).T
+    frac[:, periodic] -= np.floor(frac[:, periodic])
+    cart = frac @ box
+    r_max = max(hi for _, hi in shells)
+    heights = abs(np.linalg.det(box)) / np.linalg.norm(np.cross(box[[1, 2, 0]], box[[2, 0, 1]]), axis=1)
+    n_rep = np.where(periodic, np.ceil(r_max / heights), 0).astype(int)
+    shifts = np.array(list(itertools.product(*(range(-n, n + 1) for n in n_rep))), dtype=np.float64) @ box
+    images = cKDTree((cart[None, :, :] + shifts[:, None, :]).reshape(-1, 3))
+    found = cKDTree(cart).sparse_distance_matrix(images, r_max, output_type="ndarray")
+    found = found[found["v"] > 1e-8]
+    i, j, d = found["i"].astype(np.int64), found["j"].astype(np.int64) % len(cart), found["v"]
+    order = np.lexsort((j, i))
+    i, j, d = i[order], j[order], d[order]
+    return [(i[(d > lo) & (d <= hi)], j[(d > lo) & (d <= hi)]) for lo, hi in shells]
 
-    ## Computing neighbors and calculating warren-cowley parameters
-    neigh = mp.Neighbor(system.pos, system.box, rc= cutoff , boundary=[1,1,1])
-    neigh.compute()
-    wcp = mp.WarrenCowleyParameter(np.array(system.data["type"]), neigh.verlet_list, neigh.neighbor_number) # Initilize the WCP class.
+def wc_from_csr(types, src, indices, n_types):
+    """
+    (n_types, n_types) Warren-Cowley parameters 1 - Z_mn / (X_n Z_m) from a neighbor list
+    and 1-based types, symmetrized like mdapy's WarrenCowleyParameter.
+    """
+    t = types - 1
+    z_mn = np.bincount(t[src] * n_types + t[indices], minlength=n_types * n_types).reshape(n_types, n_types)
+    x_n = np.bincount(t, minlength=n_types) / len(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wcp = 1.0 - z_mn / (x_n[None, :] * z_mn.sum(axis=1)[:, None])
+    return (wcp + wcp.T) / 2
+
+def frame_wcp(frame, cutoff, n_types):
+    """Computed mdapy WarrenCowleyParameter of one frame; the neighbor list is reused while pos and box repeat."""
+    mp = _mdapy()
+    types = frame["type"]
+    box_lengths = np.linalg.norm(frame["box"][:3], axis=1)
+    if np.any(box_lengths[np.array(frame["boundary"]) == 1] <= 2 * (cutoff + 0.01)):
+        # box too small for a direct neighbor list: let mdapy replicate it (no reuse)
+        wcp = mp.WarrenCowleyParameter(types, rc=cutoff, pos=frame["pos"], box=frame["box"], boundary=frame["boundary"])
+    else:
+        if not _same_structure(_NEIGHBORS.get("mdapy"), frame, cutoff):
+            neigh = mp.Neighbor(frame["pos"], frame["box"], rc=cutoff, boundary=frame["boundary"])
+            neigh.compute()
+            _NEIGHBORS["mdapy"] = {"pos": frame["pos"], "box": frame["box"], "shells": cutoff,
+                                   "verlet_list": neigh.verlet_list, "neighbor_number": neigh.neighbor_number}
+        cached = _NEIGHBORS["mdapy"]
+        wcp = mp.WarrenCowleyParameter(types, cached["verlet_list"], cached["neighbor_number"])
     wcp.compute()
-    wc_array = wcp.WCP
+    return wcp
+
+def frame_wc(frame, shells, n_types, backend=BACKEND):
+    """(n_shells, n_types, n_types) Warren-Cowley parameters of one frame with the chosen backend."""
+    if np.bincount(frame["type"], minlength=n_types + 1)[1:].min() == 0:
+        raise ValueError(f"Timestep {frame['timestep']}: a species is missing (types {np.unique(frame['type']).tolist()})")
+    if backend == "auto":
+        small = len(frame["type"]) <= NUMPY_MAX_ATOMS
+        backend = "numpy" if small or len(shells) > 1 or not _have_mdapy() else "mdapy"
+    if backend == "mdapy":
+        if len(shells) > 1 or shells[0][0] > 0:
+            raise ValueError("The mdapy backend handles one (0, cutoff] shell; use backend='numpy' for shells")
+        return frame_wcp(frame, shells[0][1], n_types).WCP[None]
+    if backend != "numpy":
+        raise ValueError(f"Unknown backend '{backend}' (use 'auto', 'numpy' or 'mdapy')")
+    if not _same_structure(_NEIGHBORS.get("numpy"), frame, shells):
+        _NEIGHBORS["numpy"] = {"pos": frame["pos"], "box": frame["box"], "shells": shells,
+                               "csr": csr_neighbors(frame, shells)}
+    return np.stack([wc_from_csr(frame["type"], src, indices, n_types) for src, indices in _NEIGHBORS["numpy"]["csr"]])
 
-    ## Storing the array and printing if needed
-    wc_11, wc_12, wc_13, wc_22, wc_23, wc_33 = wc_array[0][0], wc_array[0][1], wc_array[0][2], wc_array[1][1], wc_array[1][2], wc_array[2][2]
+def analyze_range(args):
+    """Rows (file, frame, timestep, alpha_ij for every shell and i <= j) for the frames of one byte range of a dump file."""
+    filename, start, end, first_frame, shells, n_types, backend = args
+    iu = np.triu_indices(n_types)
+    rows = []
+    for k, frame in enumerate(read_dump_frames(filename, start, end), start=first_frame):
+        wc = frame_wc(frame, shells, n_types, backend)
+        rows.append([os.path.basename(filename), k, frame["timestep"]] + wc[:, iu[0], iu[1]].ravel().tolist())
+    return rows
 
+def plot_wc_matrix(wc, elements, filename=None):
+    """Heat map of one Warren-Cowley matrix (central element vs neighboring element)."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(5, 4.5))
+    h = ax.imshow(wc[::-1], vmin=-2, vmax=1, cmap="GnBu")
+    ax.set_xticks(np.arange(len(elements)), elements)
+    ax.set_yticks(np.arange(len(elements)), elements[::-1])
+    for i, j in itertools.product(range(len(elements)), repeat=2):
+        ax.text(j, i, f"{wc[::-1][i, j]:.2f}", ha="center", va="center", color="k")
+    ax.set_xlabel("Central element")
+    ax.set_ylabel("Neighboring element")
+    fig.colorbar(h, ax=ax, label="WCP")
+    fig.tight_layout()
+    if filename:
+        fig.savefig(filename, dpi=150)
+    else:
+        plt.show()
+    return fig, ax
+
+def calc_WC_parameter(filename, elements, cutoff, plot=True, backend=BACKEND):
+    """Warren-Cowley matrix of the first frame of one dump file (optionally plotted)."""
+    wc_array = frame_wc(next(read_dump_frames(filename)), [(0.0, cutoff)], len(elements), backend)[0]
 
     ## Plotting WC parameters
-    wcp.plot([str(ele1), str(ele2), str(ele3)])
-    return()
-   
-calc_WC_parameter("mdmc-5000000.dump", "Cr", "Mn", "V", 2.8)
\ No newline at end of file
+    if plot:
+        plot_wc_matrix(wc_array, [str(el) for el in elements])
+    return wc_array
+
+def analyze_dumps(files, elements, cutoff, output_file, n_workers=None, plot=False, shells=None, backend=BACKEND):
+    """Warren-Cowley parameters of every frame of `files` (glob pattern or list) into one table."""
+    paths = sorted(glob.glob(files) if isinstance(files, str) else files, key=natural_key)
+    if not paths:
+        raise FileNotFoundError(f"No dump files match {files!r}")
+    n_types = len(elements)
+    shells = [(float(lo), float(hi)) for lo, hi in shells] if shells else [(0.0, float(cutoff))]
+    jobs = [(path, start, end, first, shells, n_types, backend) for path in paths for start, end, first in frame_ranges(path)]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(jobs))
+
+    shell_tags = [""] if len(shells) == 1 else [f"s{k + 1}_" for k in range(len(shells))]
+    header = ["file", "frame", "timestep"] + [f"alpha_{tag}{elements[i]}-{elements[j]}" for tag in shell_tags
+                                               for i, j in zip(*np.triu_indices(n_types))]
+    rows = []
+    with (Pool(n_workers) if n_workers > 1 else nullcontext()) as pool:
+        # imap keeps the job order, so rows come out sorted by file and frame
+        results = pool.imap(analyze_range, jobs) if pool else map(analyze_range, jobs)
+        for k, job_rows in enumerate(results, start=1):
+            rows += job_rows
+            if k % 100 == 0 or k == len(jobs):
+                print(f"{k}/{len(jobs)} jobs, {len(rows)} frames analyzed")
+
+    if output_file.endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(rows, columns=header).to_parquet(output_file, index=False)
+    else:
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    print(f"Wrote Warren-Cowley parameters of {len(rows)} frames to '{output_file}'.")
+
+    if plot:
+        import matplotlib.pyplot as plt
+        values = np.array([r[3:] for r in rows], dtype=np.float64)
+        fig, ax = plt.subplots(figsize=(7, 4))
+        for k, name in enumerate(header[3:]):
+            ax.plot(values[:, k], label=name[6:])
+        ax.set_xlabel("frame")
+        ax.set_ylabel("Warren-Cowley parameter")
+        ax.legend(ncol=2, fontsize=8)
+        fig.tight_layout()
+        fig.savefig(os.path.splitext(output_file)[0] + ".png", dpi=150)
+    return rows
+
+
+def main():
+    analyze_dumps(DUMP_FILES, ELEMENTS, CUTOFF, OUTPUT_FILE, N_WORKERS, PLOT, SHELLS, BACKEND)
+
+
+if __name__ == "__main__":
+    main()